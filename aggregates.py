@@ -0,0 +1,133 @@
+import math
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import numpy as np
+
+from transaction import Transaction
+
+
+class RunningAggregates:
+    """Running totals, counts and sums of squares of transaction amounts
+
+    Buckets are kept per day (YYYY-MM-DD), ISO week (YYYY-Www), month
+    (YYYY-MM) and category. Adding or removing a transaction touches one
+    bucket of each kind, so every update is O(1).
+    """
+
+    PERIODS = ('day', 'week', 'month', 'category')
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+        self.sum_sq = 0.0
+        self.buckets = {period: {} for period in self.PERIODS}
+
+    @classmethod
+    def from_columns(cls, columns) -> 'RunningAggregates':
+        """Build every bucket from TransactionColumns in a few vectorized passes
+
+        Sums are taken per distinct day with bincount and then folded into
+        weeks and months, so the Python work scales with the number of days,
+        not transactions.
+        """
+        aggregates = cls()
+        amount = np.asarray(columns.amount, dtype=np.float64)
+        aggregates.total = float(amount.sum())
+        aggregates.count = len(amount)
+        aggregates.sum_sq = float(np.dot(amount, amount))
+
+        days, day_of_row = np.unique(columns.date, return_inverse=True)
+        per_day = zip(days.tolist(),
+                      np.bincount(day_of_row, amount).tolist(),
+                      np.bincount(day_of_row).tolist(),
+                      np.bincount(day_of_row, amount * amount).tolist())
+        for day, total, count, sum_sq in per_day:
+            for period, key in zip(cls.PERIODS, cls.bucket_keys(day)):
+                bucket = aggregates.buckets[period].setdefault(key, [0.0, 0, 0.0])
+                bucket[0] += total
+                bucket[1] += count
+                bucket[2] += sum_sq
+
+        codes = np.asarray(columns.category)
+        size = len(columns.categories)
+        per_category = zip(columns.categories,
+                           np.bincount(codes, amount, minlength=size).tolist(),
+                           np.bincount(codes, minlength=size).tolist(),
+                           np.bincount(codes, amount * amount, minlength=size).tolist())
+        for name, total, count, sum_sq in per_category:
+            if count:
+                aggregates.buckets['category'][name] = [total, count, sum_sq]
+        return aggregates
+
+    @staticmethod
+    @lru_cache(maxsize=65536)
+    def bucket_keys(day: int) -> Tuple[str, str, str]:
+        """Day, ISO week and month keys for a day ordinal (cached per day)"""
+        d = date.fromordinal(day)
+        iso_year, iso_week, _ = d.isocalendar()
+        return (
+            f"{d.year:04d}-{d.month:02d}-{d.day:02d}",
+            f"{iso_year:04d}-W{iso_week:02d}",
+            f"{d.year:04d}-{d.month:02d}"
+        )
+
+    def _update(self, txn: Transaction, sign: int):
+        amount = txn.amount
+        self.total += sign * amount
+        self.count += sign
+        self.sum_sq += sign * amount * amount
+
+        day, week, month = self.bucket_keys(txn.date)
+        for period, key in zip(self.PERIODS, (day, week, month, txn.category)):
+            bucket = self.buckets[period].setdefault(key, [0.0, 0, 0.0])
+            bucket[0] += sign * amount
+            bucket[1] += sign
+            bucket[2] += sign * amount * amount
+            if bucket[1] <= 0:
+                del self.buckets[period][key]
+
+    def add(self, txn: Transaction):
+        self._update(txn, 1)
+
+    def merge(self, other: 'RunningAggregates'):
+        """Add every bucket of another aggregate, e.g. from_columns() of a new batch"""
+        self.total += other.total
+        self.count += other.count
+        self.sum_sq += other.sum_sq
+        for period, buckets in other.buckets.items():
+            mine = self.buckets[period]
+            for key, (total, count, sum_sq) in buckets.items():
+                bucket = mine.setdefault(key, [0.0, 0, 0.0])
+                bucket[0] += total
+                bucket[1] += count
+                bucket[2] += sum_sq
+
+    def remove(self, txn: Transaction):
+        self._update(txn, -1)
+
+    def totals(self, period: str) -> Dict[str, float]:
+        """Total amount per bucket, ordered by bucket key"""
+        buckets = self.buckets[period]
+        return {key: buckets[key][0] for key in sorted(buckets)}
+
+    def bucket(self, period: str, key: str) -> Dict:
+        """Total, count, mean and std of a single bucket"""
+        total, count, sum_sq = self.buckets[period].get(key, (0.0, 0, 0.0))
+        return {'total': total, 'count': count, **self._moments(total, count, sum_sq)}
+
+    @staticmethod
+    def _moments(total: float, count: int, sum_sq: float) -> Dict:
+        if not count:
+            return {'mean': 0.0, 'std': 0.0}
+        mean = total / count
+        return {'mean': mean, 'std': math.sqrt(max(sum_sq / count - mean * mean, 0.0))}
+
+    @property
+    def mean(self) -> float:
+        return self._moments(self.total, self.count, self.sum_sq)['mean']
+
+    @property
+    def std(self) -> float:
+        return self._moments(self.total, self.count, self.sum_sq)['std']
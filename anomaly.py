@@ -0,0 +1,344 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+from dates import days_to_datetime64
+
+
+class AnomalyDetector:
+    """Vectorized outlier scoring over TransactionColumns
+
+    Each amount is scored against a baseline of comparable transactions:
+    all of them, or those of the same category and/or calendar month
+    (`by`), optionally only the ones in the trailing `window_days` before
+    it. 'zscore' uses mean and standard deviation, 'mad' the modified
+    z-score 0.6745 * (x - median) / MAD, which a few huge outliers cannot
+    mask. Groups with fewer than `min_count` transactions, or with no
+    spread at all, score 0 instead of dividing by zero.
+
+    Everything is computed with sorts, bincounts and cumulative sums over
+    whole columns; there is no per-transaction Python loop.
+    """
+
+    METHODS = ('zscore', 'mad')
+    GROUPS = ('category', 'month')
+
+    def __init__(self, threshold: float = 2.5, method: str = 'zscore',
+                 by: Sequence[str] = ('category',), window_days: Optional[int] = None,
+                 min_count: int = 5):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown anomaly method: {method}")
+        if any(group not in self.GROUPS for group in by):
+            raise ValueError(f"Anomaly baselines can be grouped by {', '.join(self.GROUPS)}")
+        if window_days is not None and method != 'zscore':
+            raise ValueError("Rolling baselines support the 'zscore' method only")
+        self.threshold = threshold
+        self.method = method
+        self.by = tuple(by)
+        self.window_days = window_days
+        self.min_count = min_count
+
+    def groups(self, columns) -> np.ndarray:
+        """Dense baseline group number of every row"""
+        keys = np.zeros(len(columns), dtype=np.int64)
+        if not len(keys):
+            return keys
+        if 'category' in self.by:
+            keys = keys * (len(columns.categories) + 1) + np.asarray(columns.category)
+        if 'month' in self.by:
+            months = days_to_datetime64(columns.date).astype('datetime64[M]').astype(np.int64)
+            months -= months.min()
+            keys = keys * (int(months.max()) + 1) + months
+        if keys.max() <= 4 * len(keys):
+            # Small key range: renumber through a lookup table instead of sorting
+            present = np.bincount(keys) > 0
+            return (np.cumsum(present) - 1)[keys]
+        _, groups = np.unique(keys, return_inverse=True)
+        return groups.reshape(-1)
+
+    def scores(self, columns) -> np.ndarray:
+        """Signed anomaly score of every row (0 where no baseline applies)"""
+        amount = np.asarray(columns.amount, dtype=np.float64)
+        if not len(amount):
+            return np.zeros(0)
+        groups = self.groups(columns)
+        if self.window_days is not None:
+            return self._rolling_scores(amount, groups, np.asarray(columns.date, dtype=np.int64))
+        if self.method == 'mad':
+            return self._robust_scores(amount, groups)
+        return self._z_scores(amount, groups)
+
+    def mask(self, columns, threshold: float = None) -> np.ndarray:
+        """Boolean mask of anomalous rows"""
+        threshold = self.threshold if threshold is None else threshold
+        return np.abs(self.scores(columns)) > threshold
+
+    def detect(self, columns, threshold: float = None) -> np.ndarray:
+        """Row indices of anomalous transactions, in row order"""
+        return np.flatnonzero(self.mask(columns, threshold))
+
+    def _z_scores(self, amount: np.ndarray, groups: np.ndarray) -> np.ndarray:
+        counts = np.bincount(groups)
+        means = np.bincount(groups, amount) / counts
+        variances = np.bincount(groups, amount * amount) / counts - means * means
+        stds = np.sqrt(np.maximum(variances, 0.0))
+        # Sums of squares leave rounding noise where all amounts are equal
+        stds[stds <= 1e-9 * np.maximum(np.abs(means), 1.0)] = 0.0
+        return self._scaled(amount - means[groups], stds, counts, groups)
+
+    def _robust_scores(self, amount: np.ndarray, groups: np.ndarray) -> np.ndarray:
+        counts = np.bincount(groups)
+        medians = self._group_medians(amount, groups, counts)
+        deviation = np.abs(amount - medians[groups])
+        mads = self._group_medians(deviation, groups, counts)
+        # Over half the group identical: fall back to the mean absolute
+        # deviation, scaled to be consistent with the MAD
+        flat = mads == 0
+        if flat.any():
+            mean_abs = np.bincount(groups, deviation) / counts
+            mads[flat] = mean_abs[flat] * 1.2533 * 0.6745
+        return self._scaled(0.6745 * (amount - medians[groups]), mads, counts, groups)
+
+    @staticmethod
+    def _group_medians(values: np.ndarray, groups: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Median of `values` within each group, via one sort"""
+        order = np.argsort(values)
+        ordered = values[order[np.argsort(groups[order], kind='stable')]]
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        return (ordered[starts + (counts - 1) // 2] + ordered[starts + counts // 2]) / 2
+
+    def _rolling_scores(self, amount: np.ndarray, groups: np.ndarray,
+                        dates: np.ndarray) -> np.ndarray:
+        """Score against the same group's transactions in the preceding window_days
+
+        Transactions on the same day are not part of each other's baseline.
+        """
+        span = int(dates.max()) + self.window_days + 1
+        keys = groups * span + dates
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        # Centered so the running sums stay small enough for exact differences
+        sorted_amount = amount[order] - amount.mean()
+        sums = np.concatenate(([0.0], np.cumsum(sorted_amount)))
+        squares = np.concatenate(([0.0], np.cumsum(sorted_amount * sorted_amount)))
+
+        lo = np.searchsorted(keys, keys - self.window_days, side='left')
+        hi = np.searchsorted(keys, keys, side='left')
+        counts = hi - lo
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = (sums[hi] - sums[lo]) / counts
+            stds = np.sqrt(np.maximum((squares[hi] - squares[lo]) / counts - means * means, 0.0))
+        stds[stds <= 1e-9 * np.maximum(np.abs(np.nan_to_num(means)), 1.0)] = 0.0
+
+        scores = np.zeros(len(amount))
+        valid = (counts >= self.min_count) & (stds > 0)
+        scores[order[valid]] = (sorted_amount[valid] - means[valid]) / stds[valid]
+        return scores
+
+    def _scaled(self, deviation: np.ndarray, spread: np.ndarray, counts: np.ndarray,
+                groups: np.ndarray) -> np.ndarray:
+        usable = (counts >= self.min_count) & (spread > 0)
+        safe = np.where(usable, spread, 1.0)
+        return np.where(usable[groups], deviation / safe[groups], 0.0)
+
+
+class OnlineAnomalyScorer:
+    """Streaming per-category (and optionally per-merchant) anomaly scores
+
+    Keeps Welford running count, mean and sum of squared deviations for
+    every category, and for every merchant (normalized description) when
+    `per_merchant` is set. A transaction is scored in O(1) against the
+    transactions seen before it: by its merchant's baseline once that has
+    `min_count` members with some spread, else by its category's.
+    """
+
+    def __init__(self, threshold: float = 2.5, min_count: int = 5, per_merchant: bool = False):
+        self.threshold = threshold
+        self.min_count = min_count
+        self.per_merchant = per_merchant
+        self.stats = {}  # ('category' | 'merchant', name) -> [count, mean, m2]
+
+    @staticmethod
+    def merchant(description: str) -> str:
+        return ' '.join(description.lower().split())
+
+    def _keys(self, txn) -> list:
+        keys = [('category', txn.category)]
+        if self.per_merchant:
+            keys.insert(0, ('merchant', self.merchant(txn.description)))
+        return keys
+
+    def _z(self, stats: list, amount: float) -> Optional[float]:
+        count, mean, m2 = stats
+        if count < self.min_count:
+            return None
+        std = (max(m2, 0.0) / count) ** 0.5
+        if std <= 1e-9 * max(abs(mean), 1.0):
+            return None
+        return (amount - mean) / std
+
+    def score(self, txn) -> float:
+        """Score against the current baselines without recording the transaction"""
+        for key in self._keys(txn):
+            stats = self.stats.get(key)
+            z = None if stats is None else self._z(stats, txn.amount)
+            if z is not None:
+                return round(z, 4)
+        return 0.0
+
+    def add(self, txn):
+        for key in self._keys(txn):
+            stats = self.stats.setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            delta = txn.amount - stats[1]
+            stats[1] += delta / stats[0]
+            stats[2] += delta * (txn.amount - stats[1])
+
+    def remove(self, txn):
+        """Reverse a previous add (Welford in reverse)"""
+        for key in self._keys(txn):
+            stats = self.stats.get(key)
+            if stats is None:
+                continue
+            if stats[0] <= 1:
+                del self.stats[key]
+                continue
+            count, mean, m2 = stats
+            previous = (count * mean - txn.amount) / (count - 1)
+            stats[0] = count - 1
+            stats[1] = previous
+            stats[2] = max(m2 - (txn.amount - previous) * (txn.amount - mean), 0.0)
+
+    def observe(self, txn) -> float:
+        """Score a new transaction, record it and return the score"""
+        score = self.score(txn)
+        self.add(txn)
+        return score
+
+    def observe_columns(self, columns) -> np.ndarray:
+        """observe() every row of a TransactionColumns batch in row order, vectorized
+
+        Each row is scored against its baseline's running statistics merged
+        with the earlier rows of the batch (prefix sums per group). The batch
+        is then folded into the statistics with Chan's parallel form of
+        Welford's update, so the Python work is per group, not per row.
+        """
+        amount = np.asarray(columns.amount, dtype=np.float64)
+        scores = np.zeros(len(amount))
+        if not len(amount):
+            return scores
+        decided = np.zeros(len(amount), dtype=bool)
+        merged = []
+        for kind, names, groups in self._group_keys(columns):
+            size = len(names)
+            prior = np.array([self.stats.get((kind, name), (0, 0.0, 0.0)) for name in names],
+                             dtype=np.float64).reshape(size, 3)
+            n0, m0, q0 = prior[:, 0], prior[:, 1], prior[:, 2]
+            counts = np.bincount(groups, minlength=size)
+            means = np.bincount(groups, amount, minlength=size) / np.maximum(counts, 1)
+            # Centered on the group's running mean (the batch mean for new groups)
+            ref = np.where(n0 > 0, m0, means)
+
+            order = np.argsort(groups, kind='stable')
+            g = groups[order]
+            x = amount[order] - ref[g]
+            idx = np.arange(len(x))
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[g]
+            sums = np.concatenate(([0.0], np.cumsum(x)))
+            squares = np.concatenate(([0.0], np.cumsum(x * x)))
+            offset = m0[g] - ref[g]
+            n = n0[g] + (idx - starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = (n0[g] * offset + sums[idx] - sums[starts]) / n
+                stds = np.sqrt(np.maximum(
+                    (q0[g] + n0[g] * offset * offset + squares[idx] - squares[starts]) / n
+                    - mean * mean, 0.0))
+                z = (x - mean) / stds
+            usable = (n >= self.min_count) \
+                & (stds > 1e-9 * np.maximum(np.abs(mean + ref[g]), 1.0)) & ~decided[order]
+            scores[order[usable]] = z[usable]
+            decided[order[usable]] = True
+
+            # Chan et al.: combine (n0, m0, q0) with the batch's (counts, means, m2)
+            deviation = amount - means[groups]
+            m2 = np.bincount(groups, deviation * deviation, minlength=size)
+            total = n0 + counts
+            delta = means - m0
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean_all = m0 + delta * counts / total
+                m2_all = q0 + m2 + delta * delta * n0 * counts / total
+            used = np.flatnonzero(counts)
+            merged.append((kind, [names[i] for i in used.tolist()], total[used].astype(np.int64),
+                           mean_all[used], m2_all[used]))
+
+        for kind, used_names, total, mean_all, m2_all in merged:
+            for name, count, mean, sq in zip(used_names, total.tolist(), mean_all.tolist(),
+                                             m2_all.tolist()):
+                self.stats[(kind, name)] = [count, mean, sq]
+        return np.round(scores, 4)
+
+    def is_anomaly(self, score: Optional[float]) -> bool:
+        return score is not None and abs(score) > self.threshold
+
+    def _merchant_groups(self, columns) -> tuple:
+        """Merchant group per row plus the merchant names, via the description codes"""
+        merchants = {}
+        of_description = np.array(
+            [merchants.setdefault(self.merchant(desc), len(merchants))
+             for desc in columns.descriptions], dtype=np.int64)
+        return of_description[np.asarray(columns.description)], list(merchants)
+
+    def _group_keys(self, columns) -> list:
+        """(kind, names, group per row) for every baseline kind, most specific first"""
+        kinds = [('category', columns.categories, np.asarray(columns.category, dtype=np.int64))]
+        if self.per_merchant and len(columns):
+            groups, names = self._merchant_groups(columns)
+            kinds.insert(0, ('merchant', names, groups))
+        return kinds
+
+    def load(self, columns):
+        """Set the running statistics to those of all rows, vectorized"""
+        self.stats = {}
+        amount = np.asarray(columns.amount, dtype=np.float64)
+        if not len(amount):
+            return
+        for kind, names, groups in self._group_keys(columns):
+            counts = np.bincount(groups, minlength=len(names))
+            means = np.bincount(groups, amount, minlength=len(names)) / np.maximum(counts, 1)
+            deviation = amount - means[groups]
+            m2 = np.bincount(groups, deviation * deviation, minlength=len(names))
+            for name, count, mean, sq in zip(names, counts.tolist(), means.tolist(), m2.tolist()):
+                if count:
+                    self.stats[(kind, name)] = [count, mean, sq]
+
+    def replay_scores(self, columns) -> np.ndarray:
+        """Scores each row would have got when inserted in row order, vectorized
+
+        Used to backfill records that were stored before scoring existed.
+        """
+        amount = np.asarray(columns.amount, dtype=np.float64)
+        scores = np.zeros(len(amount))
+        if not len(amount):
+            return scores
+        decided = np.zeros(len(amount), dtype=bool)
+        centered = amount - amount.mean()
+        for _, _, groups in self._group_keys(columns):
+            order = np.argsort(groups, kind='stable')
+            x = centered[order]
+            counts = np.bincount(groups)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[groups[order]]
+            before = np.arange(len(x)) - starts  # rows of the group inserted earlier
+            sums = np.concatenate(([0.0], np.cumsum(x)))
+            squares = np.concatenate(([0.0], np.cumsum(x * x)))
+            idx = np.arange(len(x))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = (sums[idx] - sums[starts]) / before
+                stds = np.sqrt(np.maximum(
+                    (squares[idx] - squares[starts]) / before - means * means, 0.0))
+                z = (x - means) / stds
+            usable = (before >= self.min_count) \
+                & (stds > 1e-9 * np.maximum(np.abs(means + amount.mean()), 1.0))
+            rows = order[usable & ~decided[order]]
+            scores[rows] = z[usable & ~decided[order]]
+            decided[rows] = True
+        return np.round(scores, 4)
@@ -0,0 +1,178 @@
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Iterable, Optional
+from storage import write_json_atomic
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss statistics"""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def info(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._data),
+                'maxsize': self.maxsize
+            }
+
+
+class Categorizer:
+    """Keyword-based categorizer compiled into a single regular expression
+
+    All keywords are combined into one lookahead alternation ordered by rule
+    priority, so a description is scanned once and the earliest-listed
+    matching category wins, exactly as with checking each category in turn.
+    Categories the user picked by hand for a description override the rules.
+    """
+
+    DEFAULT_RULES = {
+        'food': ['swiggy', 'zomato', 'grocery', 'restaurant'],
+        'transport': ['uber', 'ola', 'petrol', 'fuel'],
+        'housing': ['rent', 'electricity', 'maintenance'],
+        'shopping': ['amazon', 'flipkart', 'myntra'],
+        'health': ['hospital', 'pharmacy', 'medicine'],
+        'entertainment': ['movie', 'netflix', 'concert'],
+        'travel': ['hotel', 'flight', 'vacation'],
+        'education': ['course', 'tuition', 'books']
+    }
+    RULES_FILE = 'categories.json'
+    OVERRIDES_FILE = 'category_overrides.json'
+
+    def __init__(self, rules: Dict[str, List[str]] = None, default: str = 'other',
+                 cache_size: int = 10000, overrides: Dict[str, str] = None,
+                 overrides_path: str = None):
+        self.rules = rules if rules is not None else self.DEFAULT_RULES
+        self.default = default
+        self.cache = LRUCache(cache_size)  # normalized description -> category
+        self.overrides = dict(overrides or {})  # normalized description -> user's category
+        self.overrides_path = overrides_path  # where override() saves them, if anywhere
+        self._compile()
+
+    @classmethod
+    def for_user(cls, user_folder: str) -> 'Categorizer':
+        """Default rules extended by the user's categories.json
+
+        User rules take priority over the defaults. The file maps a category
+        name to a list of keywords, e.g. {"pets": ["vet", "petshop"]}.
+        """
+        rules = {}
+        path = os.path.join(user_folder, cls.RULES_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    rules = {
+                        str(category): [str(kw) for kw in keywords]
+                        for category, keywords in json.load(f).items()
+                    }
+            except (ValueError, AttributeError, TypeError) as e:
+                print(f"Ignoring invalid category rules in {path}: {e}")
+                rules = {}
+
+        for category, keywords in cls.DEFAULT_RULES.items():
+            rules.setdefault(category, [])
+            rules[category] = rules[category] + keywords
+
+        overrides = {}
+        overrides_path = os.path.join(user_folder, cls.OVERRIDES_FILE)
+        if os.path.exists(overrides_path):
+            try:
+                with open(overrides_path, 'r') as f:
+                    overrides = {str(desc): str(category) for desc, category in json.load(f).items()}
+            except (ValueError, AttributeError) as e:
+                print(f"Ignoring invalid category overrides in {overrides_path}: {e}")
+        return cls(rules, overrides=overrides, overrides_path=overrides_path)
+
+    def _compile(self):
+        """Build the keyword -> category map and the combined pattern"""
+        self._categories = list(self.rules)
+        self._rank = {}
+        for rank, keywords in enumerate(self.rules.values()):
+            for kw in keywords:
+                kw = kw.lower().strip()
+                if kw and kw not in self._rank:
+                    self._rank[kw] = rank
+
+        # Alternatives are tried in priority order at each position, so the
+        # best-ranked keyword starting there is the one reported
+        ordered = sorted(self._rank, key=lambda kw: (self._rank[kw], -len(kw)))
+        self._pattern = re.compile(
+            '(?=(' + '|'.join(map(re.escape, ordered)) + '))') if ordered else None
+
+    @staticmethod
+    def normalize(description: str) -> str:
+        return description.lower().strip()
+
+    def categorize(self, description: str) -> str:
+        """Category of a single description (memoized)"""
+        key = self.normalize(description)
+        category = self.overrides.get(key)
+        if category is not None:
+            return category
+        category = self.cache.get(key)
+        if category is None:
+            category = self._match(key)
+            self.cache.put(key, category)
+        return category
+
+    def _match(self, desc: str) -> str:
+        """Run the compiled pattern over a normalized description"""
+        if self._pattern is None:
+            return self.default
+
+        best = None
+        for match in self._pattern.finditer(desc):
+            rank = self._rank[match.group(1)]
+            if best is None or rank < best:
+                best = rank
+                if rank == 0:
+                    break
+        return self.default if best is None else self._categories[best]
+
+    def categorize_many(self, descriptions: Iterable[str]) -> List[str]:
+        """Categorize a batch, looking up each distinct description once"""
+        descriptions = list(descriptions)
+        categories = {desc: self.categorize(desc) for desc in dict.fromkeys(descriptions)}
+        return [categories[desc] for desc in descriptions]
+
+    def override(self, description: str, category: str):
+        """Use the user's category for this description from now on (saved if possible)"""
+        self.overrides[self.normalize(description)] = category
+        if self.overrides_path:
+            write_json_atomic(self.overrides_path, self.overrides)
+
+    def cache_info(self) -> Dict:
+        return self.cache.info()
@@ -0,0 +1,270 @@
+import io
+import os
+import shutil
+import sys
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from storage import replace_file, fsync_dir
+from transaction import Transaction, CategoryDictionary
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: Parquet snapshots need pyarrow
+    pa = pq = None
+
+
+def _pack_strings(values: List[str]) -> tuple:
+    """UTF-8 blob plus offsets, so no fixed-width padding is stored"""
+    encoded = [v.encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+
+class TransactionColumns:
+    """A transaction table as parallel, fixed-width column arrays
+
+    `category` and `description` hold codes into the `categories` and
+    `descriptions` name lists; `score` is NaN for records never scored.
+    Columns opened from an .npy snapshot are read-only memory maps: slicing
+    and reducing them reads pages on demand and copies nothing.
+    """
+
+    def __init__(self, id: np.ndarray, amount: np.ndarray, date: np.ndarray,
+                 category: np.ndarray, description: np.ndarray,
+                 categories: List[str], descriptions: List[str], score: np.ndarray = None):
+        self.id = id  # fixed-width ASCII bytes
+        self.amount = amount  # float64
+        self.date = date  # int32 day ordinals
+        self.category = category  # int32 codes into categories
+        self.description = description  # int32 codes into descriptions
+        self.categories = categories
+        self.descriptions = descriptions
+        self.score = np.full(len(amount), np.nan) if score is None else score  # float64
+        self._decoded = None
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable[Transaction],
+                          categories: CategoryDictionary) -> 'TransactionColumns':
+        """Encode records; category codes are those of the given dictionary"""
+        transactions = list(transactions)
+        count = len(transactions)
+        descriptions = {}
+        columns = cls(
+            np.array([t.id for t in transactions], dtype='S'),
+            np.fromiter((t.amount for t in transactions), dtype=np.float64, count=count),
+            np.fromiter((t.date for t in transactions), dtype=np.int32, count=count),
+            np.fromiter((categories.code(t.category) for t in transactions),
+                        dtype=np.int32, count=count),
+            np.fromiter((descriptions.setdefault(t.description, len(descriptions))
+                         for t in transactions), dtype=np.int32, count=count),
+            [], list(descriptions),
+            np.fromiter((np.nan if t.score is None else t.score for t in transactions),
+                        dtype=np.float64, count=count)
+        )
+        columns.categories = list(categories.names)
+        return columns
+
+    def ids(self, start: int = 0, stop: int = None) -> List[str]:
+        return self.id[start:stop].astype(str).tolist()
+
+    def transactions(self, categories: CategoryDictionary, start: int = 0,
+                     stop: int = None) -> List[Transaction]:
+        """Materialize rows [start, stop) as Transaction records"""
+        if self._decoded is None or self._decoded[0] is not categories:
+            # Shared name copies, decoded once however many pages are read
+            self._decoded = (categories,
+                             [categories.intern(name) for name in self.categories],
+                             [sys.intern(desc) for desc in self.descriptions])
+        _, category_names, descriptions = self._decoded
+        return [
+            Transaction(txn_id, amount, descriptions[desc], date, category_names[category],
+                        None if score != score else score)
+            for txn_id, amount, date, category, desc, score in zip(
+                self.ids(start, stop),
+                self.amount[start:stop].tolist(),
+                self.date[start:stop].tolist(),
+                self.category[start:stop].tolist(),
+                self.description[start:stop].tolist(),
+                self.score[start:stop].tolist()
+            )
+        ]
+
+
+class ColumnarSnapshot:
+    """Transaction table stored column by column next to latest_data.json
+
+    'npy' keeps one fixed-width .npy file per column under a generation
+    directory, opened with np.load(mmap_mode='r') so loading maps the files
+    instead of reading them; a CURRENT file names the live generation and
+    is swapped atomically. 'parquet' and 'npz' are single compact files
+    that are read fully; 'parquet' falls back to 'npz' without pyarrow.
+    """
+
+    FORMATS = ('npy', 'parquet', 'npz')
+    ARRAYS = ('id', 'amount', 'date', 'category', 'description', 'score',
+              'category_blob', 'category_offsets', 'description_blob', 'description_offsets')
+
+    def __init__(self, base_path: str, fmt: str = 'npy'):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown snapshot format: {fmt}")
+        self.base_path = base_path
+        self.format = fmt
+
+    @classmethod
+    def available_format(cls, fmt: str) -> str:
+        """The format snapshots requested as `fmt` are written in"""
+        return 'npz' if fmt == 'parquet' and pq is None else fmt
+
+    @property
+    def path(self) -> str:
+        return f"{self.base_path}.{self.format}"
+
+    def exists(self) -> bool:
+        if self.format == 'npy':
+            return os.path.exists(os.path.join(self.path, 'CURRENT'))
+        return os.path.exists(self.path)
+
+    @classmethod
+    def remove(cls, base_path: str, keep: str = None):
+        """Delete snapshot files of every format except `keep`"""
+        for fmt in cls.FORMATS:
+            path = f"{base_path}.{fmt}"
+            if fmt == keep or not os.path.exists(path):
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+    @staticmethod
+    def _arrays(columns: TransactionColumns) -> Dict[str, np.ndarray]:
+        category_blob, category_offsets = _pack_strings(columns.categories)
+        description_blob, description_offsets = _pack_strings(columns.descriptions)
+        return {
+            'id': columns.id, 'amount': columns.amount, 'date': columns.date,
+            'category': columns.category, 'description': columns.description,
+            'score': columns.score,
+            'category_blob': category_blob, 'category_offsets': category_offsets,
+            'description_blob': description_blob, 'description_offsets': description_offsets
+        }
+
+    @staticmethod
+    def _columns(arrays: Dict[str, np.ndarray]) -> TransactionColumns:
+        return TransactionColumns(
+            arrays['id'], arrays['amount'], arrays['date'],
+            arrays['category'], arrays['description'],
+            _unpack_strings(arrays['category_blob'], arrays['category_offsets']),
+            _unpack_strings(arrays['description_blob'], arrays['description_offsets']),
+            arrays.get('score')  # missing in snapshots written before scoring
+        )
+
+    def _generation(self) -> int:
+        with open(os.path.join(self.path, 'CURRENT'), 'r') as f:
+            return int(f.read().strip())
+
+    def write(self, columns: TransactionColumns, fsync: bool = True):
+        """Atomically replace the snapshot with the given columns"""
+        self.format = self.available_format(self.format)
+        if self.format == 'npy':
+            self._write_npy(columns, fsync)
+        else:
+            if self.format == 'parquet':
+                table = pa.table({
+                    'id': pa.array(columns.id, type=pa.binary()),
+                    'amount': columns.amount,
+                    'date': columns.date,
+                    'score': columns.score,
+                    'category': pa.DictionaryArray.from_arrays(
+                        columns.category, pa.array(columns.categories, type=pa.string())),
+                    'description': pa.DictionaryArray.from_arrays(
+                        columns.description, pa.array(columns.descriptions, type=pa.string()))
+                })
+                sink = pa.BufferOutputStream()
+                pq.write_table(table, sink)
+                data = sink.getvalue().to_pybytes()
+            else:
+                buffer = io.BytesIO()
+                np.savez(buffer, **self._arrays(columns))
+                data = buffer.getvalue()
+            replace_file(self.path, data, fsync=fsync)
+        self.remove(self.base_path, keep=self.format)
+
+    def _write_npy(self, columns: TransactionColumns, fsync: bool):
+        """Write a new generation directory, then point CURRENT at it
+
+        Older generations are deleted once CURRENT is swapped; mappings
+        already open on them stay valid. Where the platform refuses to delete
+        a mapped file the directory is left for a later write to remove.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        os.chmod(self.path, 0o700)
+        generation = self._generation() + 1 if self.exists() else 1
+        gen_dir = os.path.join(self.path, f"{generation:08d}")
+        shutil.rmtree(gen_dir, ignore_errors=True)  # leftover of an interrupted write
+        os.makedirs(gen_dir, mode=0o700)
+
+        for name, array in self._arrays(columns).items():
+            path = os.path.join(gen_dir, f"{name}.npy")
+            with open(path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+            os.chmod(path, 0o600)
+        if fsync:
+            fsync_dir(gen_dir)
+        replace_file(os.path.join(self.path, 'CURRENT'), f"{generation}\n", fsync=fsync)
+
+        for name in os.listdir(self.path):
+            if name.isdigit() and int(name) < generation:
+                try:
+                    shutil.rmtree(os.path.join(self.path, name))
+                except OSError:
+                    pass  # still mapped on platforms that forbid deleting it
+
+    def open(self) -> TransactionColumns:
+        """Column view of the snapshot (memory-mapped for 'npy')"""
+        if self.format == 'npy':
+            gen_dir = os.path.join(self.path, f"{self._generation():08d}")
+            return self._columns({
+                name: np.load(os.path.join(gen_dir, f"{name}.npy"), mmap_mode='r',
+                              allow_pickle=False)
+                for name in self.ARRAYS
+                if os.path.exists(os.path.join(gen_dir, f"{name}.npy"))
+            })
+
+        if self.format == 'parquet':
+            if pq is None:
+                raise RuntimeError(f"pyarrow is required to read {self.path}")
+            table = pq.read_table(self.path)
+            coded = {}
+            for name in ('category', 'description'):
+                column = table.column(name).combine_chunks()
+                if not pa.types.is_dictionary(column.type):
+                    column = column.dictionary_encode()
+                coded[name] = (column.indices.to_numpy(zero_copy_only=False).astype(np.int32),
+                               column.dictionary.to_pylist())
+            return TransactionColumns(
+                np.asarray(table.column('id').to_numpy(zero_copy_only=False), dtype='S'),
+                table.column('amount').to_numpy(),
+                table.column('date').to_numpy(),
+                coded['category'][0], coded['description'][0],
+                coded['category'][1], coded['description'][1],
+                table.column('score').to_numpy() if 'score' in table.column_names else None
+            )
+
+        with np.load(self.path, allow_pickle=False) as npz:
+            return self._columns({name: npz[name] for name in self.ARRAYS if name in npz})
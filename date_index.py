@@ -0,0 +1,81 @@
+import bisect
+from typing import List, Iterable, Optional
+from transaction import Transaction
+
+
+class DateIndex:
+    """Transaction IDs kept sorted by date, overall and per category
+
+    Entries are (date, -seq, id) tuples, where seq is the insertion order, so
+    walking a list backwards yields newest dates first with ties in insertion
+    order. Range filters are two binary searches over the overall list or the
+    category's own list, i.e. O(log n + k) for k matches.
+    """
+
+    def __init__(self, transactions: Iterable[Transaction] = ()):
+        self._seq = 0
+        self._entries = {}  # id -> (entry, category)
+        self._all = []
+        self._by_category = {}
+        self.add_many(transactions)
+
+    def __len__(self) -> int:
+        return len(self._all)
+
+    def _entry(self, txn: Transaction, seq: int = None) -> tuple:
+        if seq is None:
+            self._seq += 1
+            seq = self._seq
+        return (txn.date, -seq, txn.id)
+
+    def add(self, txn: Transaction):
+        entry = self._entry(txn)
+        self._entries[txn.id] = (entry, txn.category)
+        bisect.insort(self._all, entry)
+        bisect.insort(self._by_category.setdefault(txn.category, []), entry)
+
+    def add_many(self, transactions: Iterable[Transaction]):
+        """Bulk insert; sorting the merged lists is linear for one new sorted run"""
+        added = {}
+        for txn in transactions:
+            entry = self._entry(txn)
+            self._entries[txn.id] = (entry, txn.category)
+            added.setdefault(txn.category, []).append(entry)
+        if not added:
+            return
+        for category, entries in added.items():
+            entries.sort()
+            self._by_category.setdefault(category, []).extend(entries)
+            self._by_category[category].sort()
+        self._all.extend(entry for entries in added.values() for entry in entries)
+        self._all.sort()
+
+    def remove(self, txn_id: str):
+        item = self._entries.pop(txn_id, None)
+        if item is None:
+            return
+        entry, category = item
+        for entries in (self._all, self._by_category[category]):
+            del entries[bisect.bisect_left(entries, entry)]
+        if not self._by_category[category]:
+            del self._by_category[category]
+
+    def update(self, txn: Transaction):
+        """Re-index a record whose date or category changed, keeping its order"""
+        entry, _ = self._entries[txn.id]
+        self.remove(txn.id)
+        entry = self._entry(txn, -entry[1])
+        self._entries[txn.id] = (entry, txn.category)
+        bisect.insort(self._all, entry)
+        bisect.insort(self._by_category.setdefault(txn.category, []), entry)
+
+    def query(self, start=None, end=None, category: Optional[str] = None) -> List[str]:
+        """IDs within the inclusive date range (and category), newest first"""
+        entries = self._all if category is None else self._by_category.get(category, [])
+        lo = 0 if start is None else bisect.bisect_left(entries, (start,))
+        hi = len(entries) if end is None else bisect.bisect_right(entries, (end, float('inf')))
+        return [entry[2] for entry in reversed(entries[lo:hi])]
+
+    def recent(self, n: int = 10) -> List[str]:
+        """IDs of the n newest transactions"""
+        return [entry[2] for entry in reversed(self._all[-n:])] if n > 0 else []
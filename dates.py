@@ -0,0 +1,47 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Union
+
+import numpy as np
+
+DATE_FORMAT = "%Y-%m-%d"
+UNIX_EPOCH_DAY = date(1970, 1, 1).toordinal()
+
+
+@lru_cache(maxsize=65536)
+def parse_day(text: str) -> int:
+    """Day ordinal of a YYYY-MM-DD string (raises ValueError if malformed)"""
+    return datetime.strptime(text, DATE_FORMAT).toordinal()
+
+
+@lru_cache(maxsize=65536)
+def format_day(day: int) -> str:
+    """Cached YYYY-MM-DD display string of a day ordinal"""
+    return date.fromordinal(day).strftime(DATE_FORMAT)
+
+
+def to_day(value: Union[int, str, date]) -> int:
+    """Canonical day ordinal of an ordinal, YYYY-MM-DD string, date or datetime"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        return parse_day(value)
+    return value.toordinal()
+
+
+def today() -> int:
+    return date.today().toordinal()
+
+
+def from_day(day: int) -> date:
+    return date.fromordinal(day)
+
+
+def days_to_datetime64(days) -> np.ndarray:
+    """Vectorized day ordinals -> datetime64[D]"""
+    return (np.asarray(days, dtype=np.int64) - UNIX_EPOCH_DAY).astype('datetime64[D]')
+
+
+def datetime64_to_days(values) -> np.ndarray:
+    """Vectorized datetime64 values -> day ordinals"""
+    return np.asarray(values).astype('datetime64[D]').astype(np.int64) + UNIX_EPOCH_DAY
@@ -3,10 +3,20 @@ import matplotlib.pyplot as plt
 import numpy as np
 from datetime import datetime, timedelta
 import os
+import sys
 import json
+import heapq
 import warnings
-from dateutil.relativedelta import relativedelta
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Optional, Union, Callable
+from storage import new_transaction_id, new_transaction_ids
+from aggregates import RunningAggregates
+from date_index import DateIndex
+from dates import to_day, format_day, today, from_day, days_to_datetime64, datetime64_to_days
+from transaction import Transaction, CategoryDictionary
+from columnar import TransactionColumns
+from categorizer import Categorizer
+from anomaly import AnomalyDetector, OnlineAnomalyScorer
+from forecasting import Forecaster, MonthlyPanel, TOTAL
 
 warnings.filterwarnings('ignore')
 
@@ -14,7 +24,27 @@ class FinanceTracker:
     def __init__(self, user_manager):
         """Initialize finance tracker with INR only"""
         self.user_manager = user_manager
-        self.txns = []
+        self._txn_by_id = {}  # transaction ID -> Transaction, in insertion order
+        self.aggregates = RunningAggregates()
+        self._date_index = DateIndex()
+        self._snapshot = None  # snapshot columns while records are not loaded yet
+        self._row_of = None  # transaction ID -> snapshot row, built on first lookup
+        self.categories = CategoryDictionary()  # per-user category codes
+        self.categorizer = Categorizer()
+        self.anomaly_detector = AnomalyDetector()  # per-category z-scores by default
+        self.anomaly_scorer = OnlineAnomalyScorer()  # scores transactions as they are added
+        self.forecast_model = 'holt_winters'  # or 'seasonal_naive', 'linear_trend'
+        self.forecast_settings = {}  # model keyword arguments, e.g. {'season': 12}
+        self.anomaly_flags = {}  # transaction ID -> score, for scores over the threshold
+        self._flagged_rows = None  # flagged ID -> snapshot row while lazy
+        self._backfill = None  # (rows, scores) for unscored snapshot rows while lazy
+        self.data_version = 0  # bumped by every change to the transactions
+        self._memo = {}  # analytics results of data_version _memo_version
+        self._memo_version = None
+        self._frame = None  # shared DataFrame of the transactions at _frame_version
+        self._frame_version = None
+        self._frame_added = []  # changes not applied to _frame yet
+        self._frame_removed = set()
         self.dirs = {
             'data': "data_uploads",
             'graphs': "financial_graphs",
@@ -22,9 +52,12 @@ class FinanceTracker:
         }
         self.currency = "₹"
         self.max_daily_spend = 100000  # ₹100,000 daily limit
-        self.max_csv_size = 1024*1024  # 1MB file size limit
+        self.max_csv_size = None  # optional import size limit in bytes (None = unlimited)
+        self.last_import_report = None
+        self.import_chunk_size = 50000  # rows parsed and committed per import chunk
         self.max_description_length = 200
         self._setup_secure_dirs()
+        self._load_user_categorizer()
         self._load_user_transactions()
 
     def _setup_secure_dirs(self):
@@ -36,51 +69,171 @@ class FinanceTracker:
             except Exception as e:
                 print(f"Security Warning: Could not secure directory {d}: {str(e)}")
 
-    def _load_user_transactions(self):
-        """Load transactions for current user"""
+    @property
+    def txn_by_id(self) -> Dict[str, Transaction]:
+        """Transaction ID -> record, loading the full history on first use"""
+        self._ensure_loaded()
+        return self._txn_by_id
+
+    @property
+    def date_index(self) -> DateIndex:
+        self._ensure_loaded()
+        return self._date_index
+
+    @property
+    def txns(self):
+        """Live view of all transaction records"""
+        return self.txn_by_id.values()
+
+    @property
+    def lazy(self) -> bool:
+        """True while records are still paged in from the snapshot columns"""
+        return self._snapshot is not None
+
+    def _changed(self, added: List[Transaction] = None, removed: List[str] = None):
+        """Record a change to the transactions, invalidating memoized analytics
+
+        A shared DataFrame that was current is carried over to the new
+        version by queueing the added transactions and removed ids, which
+        _transactions_frame() applies together on its next read; any other
+        change makes it be rebuilt on next use.
+        """
+        current = self._frame is not None and self._frame_version == self.data_version
+        self.data_version += 1
+        if current and (added or removed):
+            if removed:
+                self._frame_removed.update(removed)
+            if added:
+                self._frame_added.extend(added)
+            self._frame_version = self.data_version
+        else:
+            self._frame = None
+            self._frame_added, self._frame_removed = [], set()
+
+    def _memoized(self, key: tuple, compute: Callable):
+        """compute() cached under `key` until data_version changes
+
+        Results are shared between callers and must not be modified.
+        """
+        if self._memo_version != self.data_version:
+            self._memo = {}
+            self._memo_version = self.data_version
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def _ensure_loaded(self):
+        """Materialize every record and the date index (once per lazy session)"""
+        if self._snapshot is None:
+            return
+        self._snapshot = None
+        self._row_of = None
+        self._flagged_rows = None
+        self._txn_by_id = {txn.id: txn for txn in self.user_manager.load_transactions()}
+        self._date_index = DateIndex(self._txn_by_id.values())
+        if self._backfill is not None:
+            self._set_scores(*self._backfill)
+            self._backfill = None
+
+    def get_transaction(self, txn_id: str) -> Optional[Transaction]:
+        """Look up a transaction record by its ID"""
+        if self._snapshot is not None:
+            if self._row_of is None:
+                self._row_of = dict(zip(self._snapshot.ids(), range(len(self._snapshot))))
+            row = self._row_of.get(txn_id)
+            return None if row is None else self.user_manager.snapshot_transactions([row])[0]
+        return self._txn_by_id.get(txn_id)
+
+    def _load_user_categorizer(self):
+        """Compile the default rules plus the current user's custom rules"""
         if self.user_manager.current_user:
-            self.txns = [
-                {
-                    **txn,
-                    'date': datetime.strptime(txn['date'], "%Y-%m-%d") if isinstance(txn['date'], str) else txn['date']
-                } 
-                for txn in self.user_manager.current_user.get('transactions', [])
-            ]
-
-    def _save_user_transactions(self):
-        """Save transactions for current user"""
+            user_folder = self.user_manager._get_user_folder(self.user_manager.current_user['username'])
+            self.categorizer = Categorizer.for_user(user_folder)
+
+    def _load_user_transactions(self):
+        """Load transactions for current user
+
+        With an unopened columnar snapshot only the aggregates are computed
+        (vectorized over the columns); records are paged in when a view asks
+        for them and fully loaded on the first change.
+        """
         if self.user_manager.current_user:
-            self.user_manager.current_user['transactions'] = [
-                {
-                    **txn,
-                    'date': txn['date'].strftime("%Y-%m-%d") if isinstance(txn['date'], datetime) else txn['date']
-                }
-                for txn in self.txns
-            ]
-            self.user_manager.save_user_data()
+            self._changed()
+            self.categories = self.user_manager.store.category_dictionary
+            self._row_of = None
+            columns = self.user_manager.snapshot_columns()
+            if columns is not None and not self.user_manager.store.materialized:
+                self._snapshot = columns
+                self._txn_by_id = {}
+                self._date_index = DateIndex()
+                self.aggregates = RunningAggregates.from_columns(columns)
+            else:
+                # Records are shared with the JSON store, not copied
+                self._snapshot = None
+                self._txn_by_id = {txn.id: txn for txn in self.user_manager.load_transactions()}
+                self.aggregates = RunningAggregates()
+                for txn in self.txns:
+                    self.aggregates.add(txn)
+                self._date_index = DateIndex(self.txns)
+            self._load_anomaly_scores()
+
+    def _load_anomaly_scores(self):
+        """Seed the online scorer from all records and collect flagged ones
+
+        Records stored before scoring existed get the score they would have
+        had when inserted.
+        """
+        columns = self._columns()
+        self.anomaly_scorer.load(columns)
+        scores = np.array(columns.score, dtype=np.float64)
+        missing = np.flatnonzero(np.isnan(scores))
+        if len(missing):
+            scores[missing] = self.anomaly_scorer.replay_scores(columns)[missing]
+        rows = np.flatnonzero(np.abs(scores) > self.anomaly_scorer.threshold)
+        ids = columns.id[rows].astype(str).tolist()
+        self.anomaly_flags = dict(zip(ids, scores[rows].tolist()))
+        self._backfill = None
+        if self._snapshot is not None:
+            self._flagged_rows = dict(zip(ids, rows.tolist()))
+            if len(missing):
+                self._backfill = (missing, scores[missing])
+        elif len(missing):
+            self._set_scores(missing, scores[missing])
+
+    def _set_scores(self, rows: np.ndarray, scores: np.ndarray):
+        """Store backfilled scores on records (rows in insertion order)"""
+        txns = list(self._txn_by_id.values())
+        for row, score in zip(rows.tolist(), scores.tolist()):
+            if txns[row].score is None:
+                txns[row].score = score
+
+    def _flag(self, txn: Transaction):
+        if self.anomaly_scorer.is_anomaly(txn.score):
+            self.anomaly_flags[txn.id] = txn.score
+        else:
+            self.anomaly_flags.pop(txn.id, None)
+
+    def flagged_anomalies(self) -> List[Transaction]:
+        """Transactions whose score on insert crossed the threshold (a lookup, not a scan)"""
+        if self._snapshot is not None:
+            txns = self.user_manager.snapshot_transactions(
+                [self._flagged_rows[txn_id] for txn_id in self.anomaly_flags])
+            for txn in txns:
+                if txn.score is None:
+                    txn.score = self.anomaly_flags[txn.id]
+            return txns
+        return [self._txn_by_id[txn_id] for txn_id in self.anomaly_flags]
+
+    def used_categories(self) -> List[str]:
+        """Categories with at least one transaction, sorted"""
+        return sorted(self.aggregates.buckets['category'])
 
     def _categorize(self, description):
         """Enhanced keyword-based categorization"""
-        desc = description.lower().strip()
-        
-        categories = {
-            'food': ['swiggy', 'zomato', 'grocery', 'restaurant'],
-            'transport': ['uber', 'ola', 'petrol', 'fuel'],
-            'housing': ['rent', 'electricity', 'maintenance'],
-            'shopping': ['amazon', 'flipkart', 'myntra'],
-            'health': ['hospital', 'pharmacy', 'medicine'],
-            'entertainment': ['movie', 'netflix', 'concert'],
-            'travel': ['hotel', 'flight', 'vacation'],
-            'education': ['course', 'tuition', 'books']
-        }
-        
-        for category, keywords in categories.items():
-            if any(kw in desc for kw in keywords):
-                return category
-        return 'other'
+        return self.categories.intern(self.categorizer.categorize(description))
 
     def add_transaction(self, amount: float, description: str, 
-                        date: Union[str, datetime]) -> str:
+                        date: Union[str, datetime, int]) -> str:
         """Add transaction with validation"""
         try:
             if amount <= 0:
@@ -88,86 +241,215 @@ class FinanceTracker:
             if len(description) > self.max_description_length:
                 raise ValueError(f"Description exceeds {self.max_description_length} chars")
             
-            if isinstance(date, str):
-                date = datetime.strptime(date, "%Y-%m-%d")
+            date = to_day(date)  # stored per day
                 
             # Daily spending limit check
-            today = datetime.now().date()
-            daily_total = sum(
-                t['amount'] for t in self.txns 
-                if isinstance(t['date'], datetime) and 
-                t['date'].date() == today
-            )
+            daily_total = self.aggregates.bucket('day', format_day(today()))['total']
             if daily_total + amount > self.max_daily_spend:
                 raise ValueError(f"Daily limit exceeded (₹{daily_total}/{self.max_daily_spend})")
                 
             category = self._categorize(description)
-            new_txn = {
-                'amount': round(float(amount)),
-                'description': description,
-                'date': date,
-                'category': category
-            }
+            new_txn = Transaction(
+                new_transaction_id(),
+                round(float(amount)),
+                sys.intern(description),
+                date,
+                category
+            )
             
             if amount > 50000:  # ₹50k threshold
                 confirm = input(f"Confirm large transaction of ₹{amount}? (y/n): ")
                 if confirm.lower() != 'y':
                     raise ValueError("Transaction cancelled")
             
-            self.txns.append(new_txn)
-            self._save_user_transactions()
+            self.txn_by_id[new_txn.id] = new_txn
+            new_txn.score = self.anomaly_scorer.observe(new_txn)
+            self._flag(new_txn)
+            self.aggregates.add(new_txn)
+            self.date_index.add(new_txn)
+            self._changed(added=[new_txn])
+            self.user_manager.record_mutation('add', txn=new_txn)
             return category
             
         except Exception as e:
             print(f"Error adding transaction: {e}")
             raise
 
-    def detect_anomalies(self, threshold: float = 2.5) -> List[Dict]:
-        """Detect unusual transactions using Z-score"""
-        if len(self.txns) < 5:
+    def query_transactions(self, start: Union[str, datetime, int, None] = None,
+                           end: Union[str, datetime, int, None] = None,
+                           category: Optional[str] = None) -> List[Transaction]:
+        """Filter transactions by inclusive date range and category, newest first
+
+        Answered from the in-memory date index by binary search, whatever
+        the storage backend.
+        """
+        bounds = [None if d is None else to_day(d) for d in (start, end)]
+        if self._snapshot is not None:
+            rows = self._snapshot_rows(*bounds, category)
+            return self.user_manager.snapshot_transactions(rows.tolist())
+        return [self.txn_by_id[txn_id] for txn_id in self.date_index.query(*bounds, category)]
+
+    def query_ids(self, start: Union[str, datetime, int, None] = None,
+                  end: Union[str, datetime, int, None] = None,
+                  category: Optional[str] = None) -> List[str]:
+        """IDs of query_transactions() matches, without materializing the records"""
+        bounds = [None if d is None else to_day(d) for d in (start, end)]
+        if self._snapshot is not None:
+            return self._snapshot.id[self._snapshot_rows(*bounds, category)].astype(str).tolist()
+        return self.date_index.query(*bounds, category)
+
+    def _snapshot_rows(self, start: Optional[int] = None, end: Optional[int] = None,
+                       category: Optional[str] = None) -> np.ndarray:
+        """Snapshot rows matching a filter, newest first with ties in insertion order"""
+        columns = self._snapshot
+        dates = columns.date
+        mask = np.ones(len(columns), dtype=bool)
+        if start is not None:
+            mask &= dates >= start
+        if end is not None:
+            mask &= dates <= end
+        if category is not None:
+            if category not in columns.categories:
+                return np.empty(0, dtype=np.int64)
+            mask &= columns.category == columns.categories.index(category)
+        rows = np.flatnonzero(mask)
+        return rows[np.lexsort((rows, -dates[rows].astype(np.int64)))]
+
+    def recent_transactions(self, n: int = 10) -> List[Transaction]:
+        """The n newest transactions"""
+        if self._snapshot is not None:
+            dates = self._snapshot.date
+            if n <= 0 or not len(dates):
+                return []
+            n = min(n, len(dates))
+            # Only rows on or after the n-th newest date need sorting
+            oldest = int(np.partition(dates, len(dates) - n)[len(dates) - n])
+            rows = self._snapshot_rows(start=oldest)[:n]
+            return self.user_manager.snapshot_transactions(rows.tolist())
+        return [self.txn_by_id[txn_id] for txn_id in self.date_index.recent(n)]
+
+    def largest_transactions(self, n: int = 3) -> List[Transaction]:
+        """The n largest transactions by amount"""
+        return self._memoized(('largest', n), lambda: self._largest_transactions(n))
+
+    def _largest_transactions(self, n: int) -> List[Transaction]:
+        if self._snapshot is not None:
+            amounts = self._snapshot.amount
+            n = min(n, len(amounts))
+            if n <= 0:
+                return []
+            rows = np.argpartition(-amounts, n - 1)[:n].tolist()
+            rows.sort(key=lambda row: (-amounts[row], row))
+            return self.user_manager.snapshot_transactions(rows)
+        return heapq.nlargest(n, self.txns, key=lambda t: t.amount)
+
+    def update_transaction(self, txn_id: str, **changes) -> Transaction:
+        """Update fields of an existing transaction and persist the change"""
+        txn = self.txn_by_id[txn_id]
+        if 'date' in changes:
+            changes['date'] = to_day(changes['date'])
+        if 'category' in changes:
+            changes['category'] = self.categories.intern(changes['category'])
+        if 'description' in changes:
+            changes['description'] = sys.intern(changes['description'])
+        if changes.get('category', txn.category) != txn.category:
+            # The user recategorized this merchant; later ones follow their choice
+            self.categorizer.override(changes.get('description', txn.description),
+                                      changes['category'])
+        self.aggregates.remove(txn)
+        self.anomaly_scorer.remove(txn)
+        for field, value in changes.items():
+            setattr(txn, field, value)
+        txn.score = self.anomaly_scorer.observe(txn)
+        self._flag(txn)
+        self.aggregates.add(txn)
+        self.date_index.update(txn)
+        self._changed()
+        self.user_manager.record_mutation('update', txn=txn)
+        return txn
+
+    def delete_transactions(self, txn_ids: List[str]) -> int:
+        """Delete transactions by ID and persist the change"""
+        deleted = []
+        for txn_id in dict.fromkeys(txn_ids):
+            txn = self.txn_by_id.pop(txn_id, None)
+            if txn is not None:
+                self.aggregates.remove(txn)
+                self.anomaly_scorer.remove(txn)
+                self.anomaly_flags.pop(txn_id, None)
+                self.date_index.remove(txn_id)
+                deleted.append(txn_id)
+        if deleted:
+            self._changed(removed=deleted)
+            self.user_manager.record_mutation('delete', ids=deleted)
+        return len(deleted)
+
+    def detect_anomalies(self, threshold: float = None) -> List[Transaction]:
+        """Detect unusual transactions with the vectorized anomaly detector"""
+        detector = self.anomaly_detector
+        key = ('anomalies', threshold, detector.threshold, detector.method, detector.by,
+               detector.window_days, detector.min_count)
+        return self._memoized(key, lambda: self._detect_anomalies(threshold))
+
+    def _detect_anomalies(self, threshold: Optional[float]) -> List[Transaction]:
+        if self.aggregates.count < 5:
             return []
-            
-        amounts = np.array([t['amount'] for t in self.txns])
-        mean = np.mean(amounts)
-        std = np.std(amounts)
-        
-        anomalies = []
-        for txn in self.txns:
-            z_score = (txn['amount'] - mean) / std
-            if abs(z_score) > threshold:
-                anomalies.append(txn)
-        return anomalies
+        columns = self._columns()
+        return self._transactions_at(columns, self.anomaly_detector.detect(columns, threshold))
+
+    def _transactions_at(self, columns: TransactionColumns, rows) -> List[Transaction]:
+        """Records at row positions of a _columns() result"""
+        rows = rows.tolist() if isinstance(rows, np.ndarray) else list(rows)
+        if columns is self.user_manager.snapshot_columns():
+            return self.user_manager.snapshot_transactions(rows)
+        txns = list(self.txns)
+        return [txns[row] for row in rows]
 
     def predict_spending(self, months: int = 3) -> Dict:
-        """Predict future spending with moving average"""
+        """Forecast total spending of the coming months
+
+        Each month maps to the forecast 'amount', the 'lower'/'upper' bounds
+        of its backtested prediction interval and a 'confidence' in [0, 1];
+        the bounds and confidence are None while there are too few months
+        to backtest.
+        """
+        key = ('predictions', months, self._forecaster().model.signature())
+        return self._memoized(key, lambda: self._predict_spending(months))
+
+    def _predict_spending(self, months: int) -> Dict:
         try:
-            if len(self.txns) < 6:
+            if len(self.aggregates.buckets['month']) < 6:
                 return {"error": "Need at least 6 months of data"}
-                
-            df = pd.DataFrame(self.txns)
-            monthly = df.groupby(df['date'].dt.to_period('M'))['amount'].sum()
-            avg = monthly.tail(3).mean()
-            
-            preds = {}
-            last_date = monthly.index[-1].to_timestamp()
-            for i in range(1, months + 1):
-                dt = last_date + relativedelta(months=i)
-                preds[dt.strftime("%Y-%m")] = {
-                    'amount': avg * (1 + 0.02 * i),  # 2% monthly inflation
-                    'confidence': max(0.7 - (i * 0.15), 0.4)
-                }
-            return preds
+            return self.forecast_categories(months)[TOTAL]
         except Exception as e:
             return {"error": f"Prediction failed: {str(e)}"}
 
+    def forecast_categories(self, months: int = 3) -> Dict[str, Dict]:
+        """Monthly forecasts per category, with the total under forecasting.TOTAL
+
+        Fitted models are cached per user and category in the models
+        directory, so later forecasts only fit the months added since.
+        """
+        user = self.user_manager.current_user
+        forecaster = self._forecaster()
+        key = ('forecast', months, forecaster.model.signature())
+        return self._memoized(key, lambda: forecaster.forecast(
+            MonthlyPanel.from_columns(self._columns()), months, user and user['username']))
+
+    def _forecaster(self) -> Forecaster:
+        return Forecaster(self.forecast_model, cache_dir=self.dirs['models'],
+                          **self.forecast_settings)
+
     def get_recommendations(self) -> Dict:
         """Generate savings recommendations"""
+        return self._memoized(('recommendations',), self._recommendations)
+
+    def _recommendations(self) -> Dict:
         try:
-            if not self.txns:
+            if not self.aggregates.count:
                 return {}
                 
-            df = pd.DataFrame(self.txns)
-            cat_spend = df.groupby('category')['amount'].sum().to_dict()
+            cat_spend = self.aggregates.totals('category')
             
             recs = {}
             thresholds = {
@@ -186,62 +468,116 @@ class FinanceTracker:
             return {}
 
     def gen_report(self, period: str = 'monthly') -> Dict:
-        """Generate financial report with proper serialization for all data types"""
+        """Generate financial report with proper serialization for all data types
+
+        Not memoized as a whole: the insights reuse the memoized anomalies,
+        predictions and recommendations, whose keys track the detector and
+        forecast settings, and period totals come from running aggregates.
+        """
         try:
-            if not self.txns:
+            if not self.aggregates.count:
                 return {"error": "No transactions available"}
+            return self._report(period)
 
-            # Create DataFrame with serializable dates
-            df = pd.DataFrame([{
-                'amount': txn['amount'],
-                'description': txn['description'],
-                'date': txn['date'].strftime('%Y-%m-%d') if hasattr(txn['date'], 'strftime') else txn['date'],
-                'category': txn['category']
-            } for txn in self.txns])
+        except Exception as e:
+            return {"error": f"Report generation failed: {str(e)}"}
 
-            # Generate period-based report
-            if period == 'monthly':
-                report_data = df.groupby(df['date'].str[:7])['amount'].sum()  # YYYY-MM
-                period_name = "Month"
-            elif period == 'weekly':
-                df['week'] = pd.to_datetime(df['date']).dt.strftime('%Y-W%U')
-                report_data = df.groupby('week')['amount'].sum()
-                period_name = "Week"
-            else:  # category
-                report_data = df.groupby('category')['amount'].sum()
-                period_name = "Category"
-
-            # Convert to display-friendly format
-            report_df = pd.DataFrame({
-                period_name: report_data.index,
-                'Amount (₹)': report_data.values.round(2)
-            })
-
-            # Prepare full report
-            result = {
-                'period': period,
-                'data': report_df.to_dict('records'),
-                'statistics': {
-                    'total': float(df['amount'].sum().round(2)),
-                    'average': float(df['amount'].mean().round(2)),
-                    'count': len(df),
-                    'periods': len(report_data)
-                },
-                'insights': {
-                    'largest': df.nlargest(3, 'amount').to_dict('records'),
-                    'anomalies': [{
-                        **txn,
-                        'date': txn['date'] if isinstance(txn['date'], str) else txn['date'].strftime('%Y-%m-%d')
-                    } for txn in self.detect_anomalies()],
-                    'predictions': self.predict_spending(),
-                    'recommendations': self.get_recommendations()
-                }
+    def _report(self, period: str) -> Dict:
+        # Period totals come from the running aggregates
+        periods = {
+            'daily': ('day', "Day"),
+            'weekly': ('week', "Week"),
+            'monthly': ('month', "Month")
+        }
+        bucket, period_name = periods.get(period, ('category', "Category"))
+        report_data = self.aggregates.totals(bucket)
+
+        # Prepare full report
+        return {
+            'period': period,
+            'data': [
+                {period_name: key, 'Amount (₹)': round(amount, 2)}
+                for key, amount in report_data.items()
+            ],
+            'statistics': {
+                'total': round(self.aggregates.total, 2),
+                'average': round(self.aggregates.mean, 2),
+                'count': self.aggregates.count,
+                'periods': len(report_data)
+            },
+            'insights': {
+                'largest': [txn.to_record() for txn in self.largest_transactions(3)],
+                'anomalies': [txn.to_record() for txn in self.detect_anomalies()],
+                'predictions': self.predict_spending(),
+                'recommendations': self.get_recommendations()
             }
+        }
 
-            return result
+    def _columns(self) -> TransactionColumns:
+        """All transactions as column arrays
 
-        except Exception as e:
-            return {"error": f"Report generation failed: {str(e)}"}
+        Memory-mapped from the user's snapshot while it is current, so no
+        records are touched; encoded from the in-memory records otherwise.
+        """
+        columns = self.user_manager.snapshot_columns()
+        if columns is None:
+            columns = self._memoized(('columns',), lambda: TransactionColumns.from_transactions(
+                self.txns, self.categories))
+        return columns
+
+    def _transactions_frame(self) -> pd.DataFrame:
+        """All transactions as a DataFrame with datetime64 dates and categorical categories
+
+        Built once per data version and shared by all analytics, so it must
+        not be modified in place. Adds and deletes since the last read are
+        applied in one filter and one concat.
+        """
+        if self._frame is None or self._frame_version != self.data_version:
+            self._frame = self._build_frame(self._columns())
+            self._frame_version = self.data_version
+        elif self._frame_added or self._frame_removed:
+            frame, removed = self._frame, self._frame_removed
+            if removed:
+                frame = frame[~frame['id'].isin(removed)].reset_index(drop=True)
+            added = [txn for txn in self._frame_added if txn.id not in removed]
+            if added:
+                frame = self._append_frame(frame, added)
+            self._frame = frame
+        self._frame_added, self._frame_removed = [], set()
+        return self._frame
+
+    @staticmethod
+    def _build_frame(columns: TransactionColumns) -> pd.DataFrame:
+        # Explicit dtypes so an empty frame has the same ones as a filled one
+        return pd.DataFrame({
+            'id': pd.Series(columns.ids(), dtype=str),
+            'amount': np.asarray(columns.amount, dtype=np.float64),
+            'description': pd.Categorical.from_codes(
+                columns.description, categories=pd.Index(columns.descriptions, dtype=str)),
+            'date': days_to_datetime64(columns.date),
+            'category': pd.Categorical.from_codes(
+                columns.category, categories=pd.Index(columns.categories, dtype=str))
+        })
+
+    @staticmethod
+    def _append_frame(frame: pd.DataFrame, txns: List[Transaction]) -> pd.DataFrame:
+        """frame with rows for txns appended, widening the categoricals as needed"""
+        added = pd.DataFrame({
+            'id': pd.Series([txn.id for txn in txns], dtype=str),
+            'amount': np.fromiter((txn.amount for txn in txns), dtype=np.float64, count=len(txns)),
+            'description': [txn.description for txn in txns],
+            'date': days_to_datetime64([txn.date for txn in txns]),
+            'category': [txn.category for txn in txns]
+        })
+        widened = {}
+        for name in ('description', 'category'):
+            column = frame[name]
+            unseen = pd.Index(added[name].unique()).difference(column.cat.categories)
+            if len(unseen):
+                column = column.cat.add_categories(unseen)
+                widened[name] = column
+            added[name] = pd.Categorical(added[name], categories=column.cat.categories)
+        return pd.concat([frame.assign(**widened), added], ignore_index=True)
 
     def gen_graphs(self, period: str = 'monthly'):
         """Generate graphs in user-specific directory"""
@@ -255,8 +591,7 @@ class FinanceTracker:
             graph_dir = os.path.join(user_folder, 'graphs')
             os.makedirs(graph_dir, exist_ok=True)
             
-            df = pd.DataFrame(self.txns)
-            df['date'] = pd.to_datetime(df['date'])
+            df = self._transactions_frame()
             df = df.sort_values('date')
             
             plt.style.use('ggplot')
@@ -264,7 +599,7 @@ class FinanceTracker:
 
             # 1. Category Pie Chart
             plt.figure(figsize=(10, 8))
-            df.groupby('category')['amount'].sum().plot.pie(
+            df.groupby('category', observed=True)['amount'].sum().plot.pie(
                 autopct=lambda p: f'{p:.1f}%\n(₹{p*sum(df["amount"])/100:.0f})'
             )
             plt.title("Spending by Category")
@@ -306,41 +641,127 @@ class FinanceTracker:
             print(f"Error generating graphs: {e}")
             
 
-    def import_csv(self, filepath: str) -> bool:
-        """Import transactions from CSV"""
+    def import_csv(self, filepath: str, chunksize: int = None,
+                   progress: Optional[Callable[[int, float], None]] = None) -> bool:
+        """Import transactions from CSV
+
+        The file is streamed in chunks of import_chunk_size rows; each chunk is
+        parsed, categorized, scored and aggregated as one column batch and
+        committed to storage before the next one is read. Rows with an
+        unparseable amount or date, or no description, go to a rejection
+        report. progress(rows_done, fraction) is called after every chunk.
+        """
+        required = {'amount', 'description', 'date'}
+        report = {'imported': 0, 'rejected': 0, 'report_file': None}
+        self.last_import_report = report
         try:
-            df = pd.read_csv(filepath)
-            required = {'amount', 'description', 'date'}
-            if not required.issubset(df.columns):
-                print("CSV needs amount, description, date columns")
-                return False
-                
-            new_txns = []
-            for _, row in df.iterrows():
-                try:
-                    new_txns.append({
-                        'amount': float(row['amount']),
-                        'description': str(row['description']),
-                        'date': datetime.strptime(row['date'], "%Y-%m-%d"),
-                        'category': self._categorize(row['description'])
-                    })
-                except Exception as e:
-                    print(f"Skipping row {_}: {e}")
-                    continue
-                    
-            self.txns.extend(new_txns)
-            self._save_user_transactions()
-            print(f"Imported {len(new_txns)} transactions")
+            total_bytes = os.path.getsize(filepath) or 1
+            rows_done = 0
+            with open(filepath, 'r', newline='') as f:
+                chunks = pd.read_csv(f, usecols=lambda c: c in required,
+                                     dtype={'description': str, 'date': str},
+                                     chunksize=chunksize or self.import_chunk_size)
+                for chunk in chunks:
+                    if not required.issubset(chunk.columns):
+                        print("CSV needs amount, description, date columns")
+                        return False
+
+                    self._import_chunk(chunk, report)
+                    rows_done += len(chunk)
+                    if progress:
+                        progress(rows_done, min(f.tell() / total_bytes, 1.0))
+
+            print(f"Imported {report['imported']} transactions")
+            if report['rejected']:
+                print(f"Rejected {report['rejected']} rows (see {report['report_file']})")
             return True
             
         except Exception as e:
             print(f"Import failed: {e}")
             return False
 
+    def _import_chunk(self, df: pd.DataFrame, report: Dict) -> int:
+        """Validate, categorize and commit one chunk of imported rows"""
+        amounts = pd.to_numeric(df['amount'], errors='coerce')
+        dates = pd.to_datetime(df['date'], format="%Y-%m-%d", errors='coerce')
+        reasons = np.select(
+            [amounts.isna().to_numpy(), dates.isna().to_numpy(), df['description'].isna().to_numpy()],
+            ['invalid amount', 'invalid date', 'missing description'],
+            default=''
+        )
+        valid = reasons == ''
+
+        if not valid.all():
+            report['rejected'] += int((~valid).sum())
+            report['report_file'] = self._write_rejection_report(
+                df[~valid], reasons[~valid], report['report_file'])
+        if not valid.any():
+            return 0
+
+        records = self.txn_by_id
+        batch = self._import_columns(amounts[valid].to_numpy(dtype=np.float64),
+                                     datetime64_to_days(dates[valid].to_numpy()),
+                                     df['description'][valid])
+        # The whole batch is scored and aggregated at once
+        batch.score = self.anomaly_scorer.observe_columns(batch)
+        flagged = np.flatnonzero(np.abs(batch.score) > self.anomaly_scorer.threshold)
+        self.anomaly_flags.update(zip(batch.id[flagged].astype(str).tolist(),
+                                      batch.score[flagged].tolist()))
+        self.aggregates.merge(RunningAggregates.from_columns(batch))
+
+        new_txns = batch.transactions(self.categories)
+        records.update((txn.id, txn) for txn in new_txns)
+        self.date_index.add_many(new_txns)
+        self._changed(added=new_txns)
+        self.user_manager.record_mutation('extend', txns=new_txns)
+        report['imported'] += len(new_txns)
+        return len(new_txns)
+
+    def _import_columns(self, amounts: np.ndarray, days: np.ndarray,
+                        descriptions: pd.Series) -> TransactionColumns:
+        """Imported rows as a TransactionColumns batch with fresh IDs
+
+        Each distinct description is categorized once.
+        """
+        codes, uniques = pd.factorize(descriptions)
+        names = [sys.intern(desc) for desc in uniques.tolist()]
+        categories = np.array([self.categories.code(category)
+                               for category in self.categorizer.categorize_many(names)],
+                              dtype=np.int32)
+        return TransactionColumns(
+            np.array(new_transaction_ids(len(amounts)), dtype='S32'),
+            amounts,
+            days.astype(np.int32),
+            categories[codes],
+            codes.astype(np.int32),
+            list(self.categories.names),
+            names
+        )
+
+    def _write_rejection_report(self, rejected: pd.DataFrame, reasons: np.ndarray,
+                                report_file: Optional[str] = None) -> Optional[str]:
+        """Append rejected import rows with their CSV line number and reason"""
+        if not self.user_manager.current_user:
+            return None
+
+        if report_file is None:
+            user_folder = self.user_manager._get_user_folder(self.user_manager.current_user['username'])
+            report_file = os.path.join(
+                user_folder, 'reports',
+                f"import_rejections_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            )
+        exists = os.path.exists(report_file)
+        rejected.assign(line=rejected.index + 2, reason=reasons).to_csv(
+            report_file, mode='a', header=not exists, index=False)
+        if not exists:
+            os.chmod(report_file, 0o600)
+        return report_file
+
     def export_csv(self, filepath: str) -> bool:
         """Export transactions to CSV"""
         try:
-            df = pd.DataFrame(self.txns)
+            # Same columns as exports made before transactions had IDs
+            df = self._transactions_frame()[['amount', 'description', 'date', 'category']]
             df.to_csv(filepath, index=False)
             print(f"Exported {len(df)} transactions")
             return True
@@ -435,7 +856,7 @@ class FinanceTracker:
                 # Add transaction (INR only)
                 cat = self.add_transaction(amt, desc, date)
                 print(f"\n✓ Added ₹{amt:.2f} as {cat}")
-                print(f"{desc} on {date.strftime('%d %b %Y')}")
+                print(f"{desc} on {from_day(to_day(date)).strftime('%d %b %Y')}")
                 
                 if input("\nAdd another? (y/n): ").lower() != 'y':
                     break
@@ -448,7 +869,7 @@ class FinanceTracker:
 
     def _show_report(self):
         """Display formatted financial report in console"""
-        if not self.txns:
+        if not self.aggregates.count:
             print("No transactions available to generate report!")
             return
 
@@ -510,41 +931,27 @@ class FinanceTracker:
 
     def _show_anomalies(self):
         """Display and manage anomaly detection results"""
-        anomalies = self.detect_anomalies()
+        anomalies = self.flagged_anomalies()
         if not anomalies:
             print("No unusual transactions found")
             return
             
         print(f"\nFound {len(anomalies)} unusual transactions:")
         for i, t in enumerate(anomalies, 1):
-            print(f"\n{i}. {t['date']}")
-            print(f"   {t['description']}")
-            print(f"   Amount: {self.currency}{t['amount']:.2f}")
-            print(f"   Category: {t['category']}")
+            print(f"\n{i}. {format_day(t.date)}")
+            print(f"   {t.description}")
+            print(f"   Amount: {self.currency}{t.amount:.2f}")
+            print(f"   Category: {t.category}")
             
             action = input("\n[a] Keep, [c] Change category, [d] Delete, [s] Skip: ").lower()
             
             if action == 'c':
-                new_cat = input(f"New category (current: {t['category']}): ").strip()
+                new_cat = input(f"New category (current: {t.category}): ").strip()
                 if new_cat:
-                    # Update the transaction in the main list
-                    for txn in self.txns:
-                        if (txn['description'] == t['description'] and 
-                            txn['date'] == t['date'] and 
-                            txn['amount'] == t['amount']):
-                            txn['category'] = new_cat
-                            break
-                    self._save_user_transactions()
+                    self.update_transaction(t.id, category=new_cat)
                     print("Category updated")
             elif action == 'd':
-                # Remove the transaction
-                self.txns = [
-                    txn for txn in self.txns 
-                    if not (txn['description'] == t['description'] and 
-                           txn['date'] == t['date'] and 
-                           txn['amount'] == t['amount'])
-                ]
-                self._save_user_transactions()
+                self.delete_transactions([t.id])
                 print("Transaction deleted")
             elif action == 's':
                 continue
@@ -580,11 +987,14 @@ class FinanceTracker:
         for month, data in preds.items():
             print(f"\n{month}:")
             print(f"Expected: {self.currency}{data['amount']:.2f}")
-            print(f"Confidence: {data.get('confidence', 1)*100:.0f}%")
+            if data['lower'] is not None:
+                print(f"Likely range: {self.currency}{data['lower']:.2f} - "
+                      f"{self.currency}{data['upper']:.2f}")
+                print(f"Confidence: {data['confidence']*100:.0f}%")
 
     def _graph_generation_flow(self):
         """Guide user through graph generation"""
-        if not self.txns:
+        if not self.aggregates.count:
             print("No transactions to visualize")
             return
             
@@ -602,7 +1012,8 @@ class FinanceTracker:
             
         print("\nCSV Import Requirements:")
         print("- Columns: amount,description,date")
-        print(f"- Max size: {self.max_csv_size/1024:.0f}KB")
+        if self.max_csv_size:
+            print(f"- Max size: {self.max_csv_size/1024:.0f}KB")
         print("- UTF-8 encoding recommended")
         
         filepath = input("Path to CSV file: ").strip('"')
@@ -615,7 +1026,7 @@ class FinanceTracker:
             if os.path.islink(filepath):
                 raise ValueError("Symbolic links not allowed")
                 
-            if os.path.getsize(filepath) > self.max_csv_size:
+            if self.max_csv_size and os.path.getsize(filepath) > self.max_csv_size:
                 raise ValueError(f"File exceeds {self.max_csv_size/1024:.0f}KB limit")
                     
             # Process import
@@ -633,7 +1044,7 @@ class FinanceTracker:
             print("\nSession expired. Please log in again.")
             return
             
-        if not self.txns:
+        if not self.aggregates.count:
             print("No transactions to export")
             return
             
@@ -0,0 +1,485 @@
+import io
+import os
+import warnings
+from itertools import product
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dates import days_to_datetime64
+from storage import replace_file
+
+TOTAL = ''  # series name of the all-category total
+
+
+def month_numbers(days) -> np.ndarray:
+    """Day ordinals -> months since 1970-01"""
+    return days_to_datetime64(days).astype('datetime64[M]').astype(np.int64)
+
+
+def month_label(month: int) -> str:
+    """Months since 1970-01 -> YYYY-MM"""
+    return str(np.datetime64(int(month), 'M'))
+
+
+class MonthlyPanel:
+    """Monthly spending of one user: a TOTAL row plus one row per used category
+
+    values[:, j] holds the totals of month `first + j`; every month from the
+    first transaction to the latest one is present, with 0 for months
+    without spending.
+    """
+
+    def __init__(self, names: List[str], first: int, values: np.ndarray):
+        self.names = names
+        self.first = first
+        self.values = values
+
+    @property
+    def last(self) -> int:
+        return self.first + self.values.shape[1] - 1
+
+    @classmethod
+    def from_columns(cls, columns) -> 'MonthlyPanel':
+        """Build all series from TransactionColumns with one bincount"""
+        amount = np.asarray(columns.amount, dtype=np.float64)
+        if not len(amount):
+            return cls([TOTAL], 0, np.zeros((1, 0)))
+        months = month_numbers(columns.date)
+        first = int(months.min())
+        width = int(months.max()) - first + 1
+        codes = np.asarray(columns.category, dtype=np.int64)
+        size = len(columns.categories)
+        cells = np.bincount(codes * width + (months - first), amount,
+                            minlength=size * width).reshape(size, width)
+        used = np.flatnonzero(np.bincount(codes, minlength=size))
+        names = [TOTAL] + [columns.categories[i] for i in used]
+        return cls(names, first, np.vstack([cells.sum(axis=0), cells[used]]))
+
+
+class ForecastModel:
+    """Base of the pluggable monthly forecasting models
+
+    State is a dict of arrays with one leading row per series, so any
+    number of series (all categories of all users) are fitted together one
+    month at a time, and a saved state resumes fitting when new months
+    arrive. `update` changes the state arrays in place.
+    """
+
+    name = None
+
+    def __init__(self, **settings):
+        self.settings = settings
+
+    def signature(self) -> str:
+        """Identifies the settings a saved state was fitted with"""
+        return f"{self.name}:{sorted(self.settings.items())}"
+
+    def init(self, rows: int) -> Dict[str, np.ndarray]:
+        raise NotImplementedError
+
+    def update(self, state: Dict[str, np.ndarray], y: np.ndarray, valid: np.ndarray):
+        """Consume one month: y[r] for every row r where valid[r]"""
+        raise NotImplementedError
+
+    def forecast(self, state: Dict[str, np.ndarray], horizon: int) -> np.ndarray:
+        """(rows, horizon) forecasts of the months after the last one consumed"""
+        raise NotImplementedError
+
+
+class SeasonalNaive(ForecastModel):
+    """Same month last year; the latest month while there is less than a year"""
+
+    name = 'seasonal_naive'
+
+    def __init__(self, season: int = 12):
+        super().__init__(season=season)
+        self.season = season
+
+    def init(self, rows: int) -> Dict[str, np.ndarray]:
+        return {'count': np.zeros(rows, dtype=np.int64),
+                'recent': np.zeros((rows, self.season))}
+
+    def update(self, state, y, valid):
+        rows = np.flatnonzero(valid)
+        state['recent'][rows, state['count'][rows] % self.season] = y[rows]
+        state['count'][rows] += 1
+
+    def forecast(self, state, horizon):
+        count = state['count'][:, None]
+        phase = (count + np.arange(horizon)) % self.season
+        seasonal = np.take_along_axis(state['recent'], phase, axis=1)
+        latest = np.take_along_axis(state['recent'], (count - 1) % self.season, axis=1)
+        return np.where(count >= self.season, seasonal, np.where(count > 0, latest, 0.0))
+
+
+class HoltWinters(ForecastModel):
+    """Additive Holt-Winters exponential smoothing
+
+    Every combination of the alpha (level), beta (trend) and gamma
+    (seasonal) candidates is run side by side, and each series forecasts
+    with the one of lowest one-step squared error so far. Zero beta or
+    gamma candidates let a series keep a fixed trend or seasonal pattern.
+    Until two full seasons are seen the series is smoothed without
+    seasonality (Holt's method); those two seasons then seed the seasonal
+    pattern, level and trend.
+    """
+
+    name = 'holt_winters'
+
+    def __init__(self, season: int = 12, alphas: Sequence[float] = (0.1, 0.3, 0.6, 0.9),
+                 betas: Sequence[float] = (0.0, 0.1), gammas: Sequence[float] = (0.0, 0.3)):
+        super().__init__(season=season, alphas=tuple(alphas), betas=tuple(betas),
+                         gammas=tuple(gammas))
+        self.season = season
+        self.grid = np.array(list(product(alphas, betas, gammas)))  # (combinations, 3)
+
+    def init(self, rows: int) -> Dict[str, np.ndarray]:
+        size = len(self.grid)
+        return {'count': np.zeros(rows, dtype=np.int64),
+                'level': np.zeros((rows, size)),
+                'trend': np.zeros((rows, size)),
+                'seasonal': np.zeros((rows, size, self.season)),
+                'sse': np.zeros((rows, size)),
+                'warmup': np.zeros((rows, 2 * self.season))}
+
+    def update(self, state, y, valid):
+        rows = np.flatnonzero(valid)
+        if not len(rows):
+            return
+        alpha, beta, gamma = self.grid.T
+        combos = np.arange(len(self.grid))
+        count = state['count'][rows]
+        first = (count == 0)[:, None]
+        warm = (count < 2 * self.season)[:, None]
+        value = y[rows][:, None]
+        phase = (count % self.season)[:, None]
+        level, trend = state['level'][rows], state['trend'][rows]
+        seasonal = state['seasonal'][rows[:, None], combos, phase]  # 0 while warm
+
+        error = value - (level + trend + seasonal)
+        state['sse'][rows] += np.where(first, 0.0, error * error)
+        new_level = np.where(first, value,
+                             alpha * (value - seasonal) + (1 - alpha) * (level + trend))
+        state['trend'][rows] = np.where(first, 0.0,
+                                        beta * (new_level - level) + (1 - beta) * trend)
+        state['seasonal'][rows[:, None], combos, phase] = np.where(
+            warm, 0.0, gamma * (value - new_level) + (1 - gamma) * seasonal)
+        state['level'][rows] = new_level
+        warming = warm[:, 0]
+        state['warmup'][rows[warming], count[warming]] = y[rows[warming]]
+        state['count'][rows] += 1
+
+        seeded = rows[state['count'][rows] == 2 * self.season]
+        if len(seeded):
+            seasons = state['warmup'][seeded].reshape(len(seeded), 2, self.season)
+            means = seasons.mean(axis=2)
+            slope = (means[:, 1] - means[:, 0]) / self.season
+            ramp = slope[:, None, None] * (np.arange(self.season) - (self.season - 1) / 2)
+            state['seasonal'][seeded] = (seasons - means[..., None] - ramp).mean(axis=1)[:, None, :]
+            state['trend'][seeded] = slope[:, None]
+            state['level'][seeded] = (means[:, 1] + slope * (self.season - 1) / 2)[:, None]
+
+    def forecast(self, state, horizon):
+        rows = np.arange(len(state['count']))
+        best = np.argmin(state['sse'], axis=1)
+        steps = np.arange(1, horizon + 1)
+        phase = (state['count'][:, None] + steps - 1) % self.season
+        seasonal = np.take_along_axis(state['seasonal'][rows, best], phase, axis=1)
+        return (state['level'][rows, best][:, None]
+                + steps * state['trend'][rows, best][:, None] + seasonal)
+
+
+class LinearTrend(ForecastModel):
+    """Least-squares straight line through each series' monthly totals
+
+    Only the running sums of t, y, t*t and t*y are kept, so new months are
+    added in O(1) per series.
+    """
+
+    name = 'linear_trend'
+
+    def init(self, rows: int) -> Dict[str, np.ndarray]:
+        state = {'count': np.zeros(rows, dtype=np.int64)}
+        state.update({key: np.zeros(rows) for key in ('st', 'sy', 'stt', 'sty')})
+        return state
+
+    def update(self, state, y, valid):
+        rows = np.flatnonzero(valid)
+        t = state['count'][rows].astype(np.float64)
+        value = y[rows]
+        state['st'][rows] += t
+        state['sy'][rows] += value
+        state['stt'][rows] += t * t
+        state['sty'][rows] += t * value
+        state['count'][rows] += 1
+
+    def forecast(self, state, horizon):
+        n = state['count'].astype(np.float64)
+        denominator = n * state['stt'] - state['st'] ** 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slope = np.where(denominator > 0,
+                             (n * state['sty'] - state['st'] * state['sy']) / denominator, 0.0)
+            intercept = np.where(n > 0, (state['sy'] - slope * state['st']) / n, 0.0)
+        steps = np.arange(1, horizon + 1)
+        return intercept[:, None] + slope[:, None] * (n[:, None] - 1 + steps)
+
+
+MODELS = {model.name: model for model in (SeasonalNaive, HoltWinters, LinearTrend)}
+
+
+class Forecaster:
+    """Fits one model over many monthly series at once and forecasts them
+
+    The latest month of a panel may still be incomplete, so fitted state
+    only covers the months before it ("settled" months) and the latest
+    month is applied to a copy when forecasting. With a `cache_dir` the
+    settled state is saved per user and category and later fits resume
+    from it, consuming only months that were not settled yet.
+
+    Before each of the last `origins` settled months is consumed the
+    model's forecast is recorded; the errors of those forecasts against
+    what was actually spent give each month's `lower`/`upper` prediction
+    interval (`level` coverage) and its `confidence`, one minus the median
+    absolute backtest error relative to the series' average month.
+    """
+
+    BATCH_ROWS = 4096  # series fitted together per vectorized pass
+
+    def __init__(self, model: str = 'holt_winters', horizon: int = 12, origins: int = 12,
+                 level: float = 0.8, cache_dir: str = None, **settings):
+        if model not in MODELS:
+            raise ValueError(f"Unknown forecasting model: {model}")
+        self.model = MODELS[model](**settings)
+        self.horizon = horizon
+        self.origins = origins
+        self.level = level
+        self.cache_dir = cache_dir
+
+    def forecast(self, panel: MonthlyPanel, months: int, key: str = None) -> Dict[str, Dict]:
+        """Forecasts of every series of one panel; `key` names its cache (the username)"""
+        return self.forecast_many([(key, panel)], months)[0]
+
+    def forecast_many(self, jobs: List[Tuple[Optional[str], MonthlyPanel]],
+                      months: int) -> List[Dict[str, Dict]]:
+        """Forecast (cache key, panel) jobs, stacked into as few passes as possible
+
+        Each result maps series name (TOTAL for the total) to
+        {YYYY-MM: {'amount', 'lower', 'upper', 'confidence'}}.
+        """
+        if not 1 <= months <= self.horizon:
+            raise ValueError(f"Forecasts reach at most {self.horizon} months")
+        results = [{} for _ in jobs]  # panels without any month forecast nothing
+        batch, rows = [], 0
+        for i, job in enumerate(jobs):
+            if job[1].values.shape[1]:
+                batch.append(i)
+                rows += len(job[1].names)
+            if batch and (rows >= self.BATCH_ROWS or i == len(jobs) - 1):
+                for j, result in zip(batch, self._run([jobs[j] for j in batch], months)):
+                    results[j] = result
+                batch, rows = [], 0
+        return results
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"user_{key}", f"forecast_{self.model.name}.npz")
+
+    def _init(self, rows: int) -> Dict[str, np.ndarray]:
+        state = self.model.init(rows)
+        state['bt_pred'] = np.full((rows, self.origins, self.horizon), np.nan)
+        state['bt_month'] = np.full((rows, self.origins), -1, dtype=np.int64)
+        return state
+
+    def _load(self, key: Optional[str], panel: MonthlyPanel) -> Optional[dict]:
+        if key is None or self.cache_dir is None:
+            return None
+        try:
+            with np.load(self._cache_path(key), allow_pickle=False) as saved:
+                if (str(saved['signature']) != self.model.signature()
+                        or int(saved['first']) != panel.first):
+                    return None
+                return {name: saved[name] for name in saved.files}
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, key: str, panel: MonthlyPanel, state: Dict[str, np.ndarray]):
+        folder = os.path.dirname(self._cache_path(key))
+        os.makedirs(folder, exist_ok=True)
+        os.chmod(folder, 0o700)
+        buffer = io.BytesIO()
+        np.savez(buffer, signature=np.array(self.model.signature()), first=np.array(panel.first),
+                 names=np.array(panel.names, dtype=str), settled=panel.values[:, :-1],
+                 **{f"state_{name}": array for name, array in state.items()})
+        replace_file(self._cache_path(key), buffer.getvalue(), fsync=False)
+
+    def _resume(self, saved: dict, panel: MonthlyPanel) -> Tuple[np.ndarray, np.ndarray, int]:
+        """(panel rows, saved rows, months consumed) of series whose saved fit still applies"""
+        consumed = saved['settled'].shape[1]
+        if consumed > panel.values.shape[1] - 1:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), 0
+        index = {name: i for i, name in enumerate(saved['names'].tolist())}
+        pairs = [(r, index[name]) for r, name in enumerate(panel.names) if name in index]
+        rows = np.array([r for r, _ in pairs], dtype=np.int64)
+        saved_rows = np.array([j for _, j in pairs], dtype=np.int64)
+        # Saved months changed (edits, backdated imports): refit those series
+        same = np.isclose(saved['settled'][saved_rows],
+                          panel.values[rows, :consumed]).all(axis=1)
+        return rows[same], saved_rows[same], consumed
+
+    def _run(self, jobs: List[Tuple[Optional[str], MonthlyPanel]], months: int) -> List[Dict]:
+        counts = [len(panel.names) for _, panel in jobs]
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        width = max(panel.values.shape[1] for _, panel in jobs)
+        # Right-aligned: column width - 1 is every panel's latest month
+        values = np.full((bounds[-1], width), np.nan)
+        last = np.zeros(bounds[-1], dtype=np.int64)
+        start = np.zeros(bounds[-1], dtype=np.int64)
+        state = self._init(bounds[-1])
+        current = []  # whether a job's saved fit is already up to date
+        for (key, panel), lo, hi in zip(jobs, bounds[:-1], bounds[1:]):
+            offset = width - panel.values.shape[1]
+            values[lo:hi, offset:] = panel.values
+            last[lo:hi] = panel.last
+            start[lo:hi] = offset
+            saved = self._load(key, panel)
+            if saved is not None:
+                rows, saved_rows, consumed = self._resume(saved, panel)
+                for name, array in state.items():
+                    array[lo + rows] = saved[f"state_{name}"][saved_rows]
+                start[lo + rows] = offset + consumed
+                current.append(len(rows) == len(panel.names) == len(saved['names'])
+                               and consumed == panel.values.shape[1] - 1)
+            else:
+                current.append(False)
+
+        settled = values[:, :-1]
+        self._fit(state, settled, start, last - 1)
+        if self.cache_dir is not None:
+            for (key, panel), lo, hi, unchanged in zip(jobs, bounds[:-1], bounds[1:], current):
+                if key is not None and not unchanged:
+                    self._save(key, panel, {name: array[lo:hi] for name, array in state.items()})
+
+        lower, upper, confidence = self._intervals(state, settled, last - 1)
+        latest = {name: array.copy() for name, array in state.items()}
+        self.model.update(latest, values[:, -1], ~np.isnan(values[:, -1]))
+        amount = np.maximum(self.model.forecast(latest, self.horizon), 0.0)
+        lower = np.minimum(np.maximum(amount + lower, 0.0), amount)
+        upper = np.maximum(amount + upper, amount)
+
+        results = []
+        for (_, panel), lo in zip(jobs, bounds[:-1]):
+            labels = [month_label(panel.last + step) for step in range(1, months + 1)]
+            results.append({
+                name: {
+                    label: {
+                        'amount': round(float(amount[r, h]), 2),
+                        'lower': self._rounded(lower[r, h]),
+                        'upper': self._rounded(upper[r, h]),
+                        'confidence': self._rounded(confidence[r, h])
+                    }
+                    for h, label in enumerate(labels)
+                }
+                for r, name in enumerate(panel.names, start=lo)
+            })
+        return results
+
+    @staticmethod
+    def _rounded(value: float) -> Optional[float]:
+        return None if np.isnan(value) else round(float(value), 2)
+
+    def _fit(self, state: Dict[str, np.ndarray], settled: np.ndarray, start: np.ndarray,
+             settled_last: np.ndarray):
+        """Consume settled months from each row's start column, recording backtest forecasts"""
+        width = settled.shape[1]
+        if not len(start) or start.min() >= width:
+            return
+        for t in range(int(start.min()), width):
+            y = settled[:, t]
+            valid = (start <= t) & ~np.isnan(y)
+            if t >= width - self.origins:
+                recorded = np.flatnonzero(valid & (state['count'] > 0))
+                if len(recorded):
+                    month = settled_last[recorded] - (width - 1 - t)
+                    slot = month % self.origins
+                    subset = {name: array[recorded] for name, array in state.items()}
+                    state['bt_pred'][recorded, slot] = self.model.forecast(subset, self.horizon)
+                    state['bt_month'][recorded, slot] = month
+            self.model.update(state, y, valid)
+
+    def _intervals(self, state: Dict[str, np.ndarray], settled: np.ndarray,
+                   settled_last: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Empirical error quantiles and confidence per row and horizon"""
+        rows, width = settled.shape
+        shape = (rows, self.horizon)
+        if not width:
+            return np.full(shape, np.nan), np.full(shape, np.nan), np.full(shape, np.nan)
+        target = state['bt_month'][:, :, None] + np.arange(self.horizon)
+        column = width - 1 - (settled_last[:, None, None] - target)
+        known = ((state['bt_month'] >= 0)[:, :, None] & (target <= settled_last[:, None, None])
+                 & (column >= 0))
+        actual = settled[np.arange(rows)[:, None, None], np.clip(column, 0, width - 1)]
+        errors = np.where(known, actual - state['bt_pred'], np.nan)
+
+        tail = (1 - self.level) / 2
+        count = (~np.isnan(errors)).sum(axis=1)
+        ordered = np.sort(errors, axis=1)
+        lower = self._quantile(ordered, count, tail)
+        upper = self._quantile(ordered, count, 1 - tail)
+        typical = self._quantile(np.sort(np.abs(errors), axis=1), count, 0.5)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # all-padding rows
+            scale = np.nanmean(np.abs(settled), axis=1)[:, None]
+        enough = count >= 2
+        lower[~enough] = upper[~enough] = typical[~enough] = np.nan
+        with np.errstate(invalid='ignore', divide='ignore'):
+            confidence = np.clip(1 - np.where(scale > 0, typical / scale, 0.0), 0.0, 1.0)
+        confidence[np.isnan(typical)] = np.nan
+        # Horizons without enough backtests take the nearest shorter one's
+        # values; intervals never narrow and confidence never grows with it
+        return (np.fmin.accumulate(lower, axis=1), np.fmax.accumulate(upper, axis=1),
+                np.fmin.accumulate(confidence, axis=1))
+
+    @staticmethod
+    def _quantile(ordered: np.ndarray, count: np.ndarray, q: float) -> np.ndarray:
+        """q-quantile along axis 1 of values sorted with NaN last, as np.nanquantile
+
+        np.nanquantile loops in Python over every row and horizon.
+        """
+        position = q * np.maximum(count - 1, 0)
+        below = np.floor(position).astype(np.int64)
+        above = np.minimum(below + 1, np.maximum(count - 1, 0))
+        low = np.take_along_axis(ordered, below[:, None], axis=1)[:, 0]
+        high = np.take_along_axis(ordered, above[:, None], axis=1)[:, 0]
+        return np.where(count > 0, low + (high - low) * (position - below), np.nan)
+
+
+def forecast_all_users(user_manager, months: int = 3, model: str = 'holt_winters',
+                       models_dir: str = 'ai_models', **settings) -> Dict[str, Dict[str, Dict]]:
+    """Batch job: forecast every category of every user
+
+    Reads each user's saved transactions without logging in, then fits
+    all series in stacked vectorized passes, resuming cached fits.
+    """
+    jobs = []
+    for username in user_manager.usernames():
+        try:
+            columns = user_manager.user_columns(username)
+        except Exception as e:
+            print(f"Skipping {username}: {e}")
+            continue
+        if len(columns):
+            jobs.append((username, MonthlyPanel.from_columns(columns)))
+    forecaster = Forecaster(model, cache_dir=models_dir, **settings)
+    results = forecaster.forecast_many(jobs, months)
+    return {username: result for (username, _), result in zip(jobs, results)}
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from user_manager import UserManager
+
+    started = time.time()
+    forecasts = forecast_all_users(UserManager(), *(int(arg) for arg in sys.argv[1:2]))
+    series = sum(len(result) for result in forecasts.values())
+    print(f"Forecast {series} series of {len(forecasts)} users in {time.time() - started:.2f}s")
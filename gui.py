@@ -1,24 +1,168 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 from datetime import datetime
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import pandas as pd
 import os
+import threading
 from PIL import Image, ImageTk
-from finance_tracker import FinanceTracker  
+from finance_tracker import FinanceTracker
+from dates import format_day
+
+
+class VirtualTreeview:
+    """Treeview that only materializes the rows in view plus a small buffer
+
+    The full result is a pre-sorted list of row IDs; rows are formatted and
+    inserted only when they scroll into the window, and the scrollbar is
+    driven from the window offset so its proportions reflect every row.
+    """
+
+    def __init__(self, parent, columns, row_values, buffer: int = 10, **options):
+        self.row_values = row_values  # row ID -> tuple of column values
+        self.buffer = buffer
+        self.rows = []
+        self.first = 0
+        self.selected = set()
+        self._window = []
+        self._rendering = False
+
+        self.frame = ttk.Frame(parent)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show='headings', **options)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        self.tree.bind('<Configure>', lambda e: self._render())
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<Up>', lambda e: self._on_arrow(-1))
+        self.tree.bind('<Down>', lambda e: self._on_arrow(1))
+        self.tree.bind('<Prior>', lambda e: self.scroll(-self.visible_rows()) or 'break')
+        self.tree.bind('<Next>', lambda e: self.scroll(self.visible_rows()) or 'break')
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def set_rows(self, rows):
+        """Show a new pre-sorted list of row IDs from the top"""
+        self.rows = list(rows)
+        self.first = 0
+        self.selected &= set(self.rows)
+        self._window = []
+        self._render()
+
+    def selection(self) -> tuple:
+        """Selected row IDs, including rows scrolled out of the window"""
+        if len(self.selected) <= 1:
+            return tuple(self.selected)
+        return tuple(row for row in self.rows if row in self.selected)
+
+    def _row_height(self) -> int:
+        height = ttk.Style().lookup('Treeview', 'rowheight')
+        try:
+            return int(height) if height else 20
+        except (ValueError, tk.TclError):
+            return 20
+
+    def visible_rows(self) -> int:
+        """Number of rows that fit in the widget below the heading"""
+        height = self.tree.winfo_height()
+        if height <= 1:  # not mapped yet
+            return int(self.tree.cget('height'))
+        header = self._row_height()
+        children = self.tree.get_children()
+        if children:
+            bbox = self.tree.bbox(children[0])
+            if bbox:
+                header = bbox[1]
+        return max(1, (height - header) // self._row_height())
+
+    def scroll(self, delta: int):
+        self._scroll_to(self.first + delta)
+
+    def _scroll_to(self, first: int):
+        first = max(0, min(first, len(self.rows) - self.visible_rows()))
+        if first != self.first:
+            self.first = first
+            self._render()
+
+    def _render(self):
+        visible = self.visible_rows()
+        window = self.rows[self.first:self.first + visible + self.buffer]
+        self._rendering = True
+        try:
+            if window != self._window:
+                children = self.tree.get_children()
+                if children:
+                    self.tree.delete(*children)
+                for row in window:
+                    self.tree.insert('', tk.END, iid=row, values=self.row_values(row))
+                self._window = window
+            self.tree.selection_set([row for row in window if row in self.selected])
+            self.tree.yview_moveto(0)
+        finally:
+            self._rendering = False
+
+        total = len(self.rows)
+        if total:
+            self.scrollbar.set(self.first / total, min(self.first + visible, total) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self._scroll_to(int(float(amount) * len(self.rows)))
+        elif action == 'scroll':
+            step = self.visible_rows() if unit == 'pages' else 1
+            self.scroll(int(amount) * step)
+
+    def _on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        steps = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll(-steps * 3)
+        return 'break'
+
+    def _on_select(self, event):
+        if self._rendering:
+            return
+        self.selected = (self.selected - set(self._window)) | set(self.tree.selection())
+
+    def _on_arrow(self, delta: int):
+        """Move the selection one row, scrolling the window at its edges"""
+        if not self.rows:
+            return 'break'
+        focus = self.tree.focus()
+        index = self.first + self._window.index(focus) + delta if focus in self._window else self.first
+        index = max(0, min(index, len(self.rows) - 1))
+        visible = self.visible_rows()
+        if index < self.first:
+            self._scroll_to(index)
+        elif index >= self.first + visible:
+            self._scroll_to(index - visible + 1)
+        row = self.rows[index]
+        self.selected = {row}
+        self._render()
+        self.tree.focus(row)
+        return 'break'
 
 
 class FinanceTrackerGUI:
     def __init__(self, root, finance_tracker):
         self.root = root
         self.ft = finance_tracker
+        self._closing = False  # logout in progress
+        self._import_thread = None  # running CSV import, if any
         self.setup_main_window()
         
     def setup_main_window(self):
         self.root.title("Personal Finance Tracker")
         self.root.geometry("1000x700")
         self.root.minsize(800, 600)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Configure style
         style = ttk.Style()
@@ -83,16 +227,14 @@ class FinanceTrackerGUI:
         summary_frame = ttk.Frame(dashboard_frame)
         summary_frame.pack(fill=tk.X, pady=(0, 10))
         
-        # Get summary data
-        total_spent = sum(t['amount'] for t in self.ft.txns)
-        avg_spent = total_spent / len(self.ft.txns) if self.ft.txns else 0
-        categories = len(set(t['category'] for t in self.ft.txns))
+        # Get summary data from the running aggregates
+        aggregates = self.ft.aggregates
         
         summary_data = [
-            ("Total Spent", f"₹{total_spent:,.2f}"),
-            ("Avg. Transaction", f"₹{avg_spent:,.2f}"),
-            ("Categories", str(categories)),
-            ("Transactions", str(len(self.ft.txns)))
+            ("Total Spent", f"₹{aggregates.total:,.2f}"),
+            ("Avg. Transaction", f"₹{aggregates.mean:,.2f}"),
+            ("Categories", str(len(aggregates.buckets['category']))),
+            ("Transactions", str(aggregates.count))
         ]
         
         for i, (title, value) in enumerate(summary_data):
@@ -128,14 +270,14 @@ class FinanceTrackerGUI:
         self.recent_tree.pack(fill=tk.BOTH, expand=True)
         
         # Populate with recent transactions
-        recent_txns = sorted(self.ft.txns, key=lambda x: x['date'], reverse=True)[:10]
+        recent_txns = self.ft.recent_transactions(10)
         for txn in recent_txns:
-            date_str = txn['date'].strftime('%Y-%m-%d') if hasattr(txn['date'], 'strftime') else txn['date']
-            self.recent_tree.insert('', tk.END, values=(
+            date_str = format_day(txn.date)
+            self.recent_tree.insert('', tk.END, iid=txn.id, values=(
                 date_str,
-                txn['description'],
-                f"₹{txn['amount']:,.2f}",
-                txn['category']
+                txn.description,
+                f"₹{txn.amount:,.2f}",
+                txn.category
             ))
     
     def show_add_transaction(self):
@@ -165,7 +307,7 @@ class FinanceTrackerGUI:
         
         ttk.Label(form_frame, text="Category:").grid(row=3, column=0, padx=5, pady=5, sticky=tk.E)
         self.category_var = tk.StringVar()
-        categories = sorted(set(t['category'] for t in self.ft.txns))
+        categories = self.ft.used_categories()
         self.category_combo = ttk.Combobox(
             form_frame, 
             textvariable=self.category_var,
@@ -245,7 +387,7 @@ class FinanceTrackerGUI:
         ttk.Label(filter_frame, text="Filter by:").pack(side=tk.LEFT, padx=5)
         
         self.filter_category_var = tk.StringVar()
-        categories = ['All'] + sorted(set(t['category'] for t in self.ft.txns))
+        categories = ['All'] + self.ft.used_categories()
         ttk.Combobox(
             filter_frame, 
             textvariable=self.filter_category_var,
@@ -267,29 +409,21 @@ class FinanceTrackerGUI:
         
         ttk.Button(filter_frame, text="Apply", command=self.apply_filters).pack(side=tk.LEFT, padx=5)
         
-        # Transaction table
-        table_frame = ttk.Frame(trans_frame)
-        table_frame.pack(fill=tk.BOTH, expand=True)
-        
+        # Transaction table (only the rows in view are materialized)
         columns = ('date', 'description', 'amount', 'category')
-        self.trans_tree = ttk.Treeview(
-            table_frame, 
-            columns=columns, 
-            show='headings',
+        self.trans_tree = VirtualTreeview(
+            trans_frame,
+            columns,
+            self._transaction_row,
             selectmode='extended'
         )
         
         for col in columns:
-            self.trans_tree.heading(col, text=col.title())
-            self.trans_tree.column(col, width=100)
-        
-        self.trans_tree.column('description', width=200)
-        self.trans_tree.column('amount', anchor=tk.E)
+            self.trans_tree.tree.heading(col, text=col.title())
+            self.trans_tree.tree.column(col, width=100)
         
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.trans_tree.yview)
-        self.trans_tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.trans_tree.tree.column('description', width=200)
+        self.trans_tree.tree.column('amount', anchor=tk.E)
         self.trans_tree.pack(fill=tk.BOTH, expand=True)
         
         # Populate with all transactions
@@ -303,52 +437,32 @@ class FinanceTrackerGUI:
         ttk.Button(action_frame, text="Edit Selected", command=self.edit_selected).pack(side=tk.LEFT, padx=5)
     
     def update_transaction_table(self):
-        # Clear existing data
-        for item in self.trans_tree.get_children():
-            self.trans_tree.delete(item)
-        
-        # Apply filters
-        filtered = self.ft.txns.copy()
-        
-        # Category filter
+        # Apply filters (answered by the storage backend, newest first)
         category = self.filter_category_var.get()
-        if category != 'All':
-            filtered = [t for t in filtered if t['category'] == category]
-        
-        # Date range filter
-        start_date = self.start_date_var.get()
-        end_date = self.end_date_var.get()
-        
-        if start_date:
+        bounds = []
+        for value in (self.start_date_var.get(), self.end_date_var.get()):
             try:
-                start = datetime.strptime(start_date, '%Y-%m-%d')
-                filtered = [t for t in filtered if 
-                          (t['date'] if isinstance(t['date'], datetime) 
-                          else datetime.strptime(t['date'], '%Y-%m-%d')) >= start]
+                bounds.append(datetime.strptime(value, '%Y-%m-%d') if value else None)
             except ValueError:
-                pass
-                
-        if end_date:
-            try:
-                end = datetime.strptime(end_date, '%Y-%m-%d')
-                filtered = [t for t in filtered if 
-                          (t['date'] if isinstance(t['date'], datetime) 
-                          else datetime.strptime(t['date'], '%Y-%m-%d')) <= end]
-            except ValueError:
-                pass
+                bounds.append(None)
         
-        # Sort by date (newest first)
-        filtered.sort(key=lambda x: x['date'], reverse=True)
+        filtered = self.ft.query_ids(
+            *bounds,
+            category=None if category == 'All' else category
+        )
         
-        # Add to treeview
-        for txn in filtered:
-            date_str = txn['date'].strftime('%Y-%m-%d') if hasattr(txn['date'], 'strftime') else txn['date']
-            self.trans_tree.insert('', tk.END, values=(
-                date_str,
-                txn['description'],
-                f"₹{txn['amount']:,.2f}",
-                txn['category']
-            ))
+        # Rows are materialized and formatted lazily as they scroll into view
+        self.trans_tree.set_rows(filtered)
+    
+    def _transaction_row(self, txn_id):
+        txn = self.ft.get_transaction(txn_id)
+        date_str = format_day(txn.date)
+        return (
+            date_str,
+            txn.description,
+            f"₹{txn.amount:,.2f}",
+            txn.category
+        )
     
     def apply_filters(self):
         self.update_transaction_table()
@@ -366,30 +480,9 @@ class FinanceTrackerGUI:
         if not confirm:
             return
             
-        # Get the selected transaction details
-        to_delete = []
-        for item in selected:
-            values = self.trans_tree.item(item, 'values')
-            date_str = values[0]
-            description = values[1]
-            amount = float(values[2][1:].replace(',', ''))
-            
-            # Find matching transaction in the list
-            for txn in self.ft.txns:
-                txn_date = txn['date'].strftime('%Y-%m-%d') if hasattr(txn['date'], 'strftime') else txn['date']
-                if (txn_date == date_str and 
-                    txn['description'] == description and 
-                    txn['amount'] == amount):
-                    to_delete.append(txn)
-                    break
-        
-        # Remove from the list
-        for txn in to_delete:
-            self.ft.txns.remove(txn)
-        
-        # Save changes
-        self.ft._save_user_transactions()
-        messagebox.showinfo("Success", f"Deleted {len(to_delete)} transactions")
+        # Row iids are transaction IDs
+        deleted = self.ft.delete_transactions(selected)
+        messagebox.showinfo("Success", f"Deleted {deleted} transactions")
         self.update_transaction_table()
     
     def edit_selected(self):
@@ -398,20 +491,7 @@ class FinanceTrackerGUI:
             messagebox.showwarning("Warning", "Please select exactly one transaction to edit")
             return
             
-        values = self.trans_tree.item(selected[0], 'values')
-        date_str = values[0]
-        description = values[1]
-        amount = float(values[2][1:].replace(',', ''))
-        
-        # Find the transaction in the list
-        original_txn = None
-        for txn in self.ft.txns:
-            txn_date = txn['date'].strftime('%Y-%m-%d') if hasattr(txn['date'], 'strftime') else txn['date']
-            if (txn_date == date_str and 
-                txn['description'] == description and 
-                txn['amount'] == amount):
-                original_txn = txn
-                break
+        original_txn = self.ft.get_transaction(selected[0])
         
         if not original_txn:
             messagebox.showerror("Error", "Transaction not found")
@@ -428,28 +508,28 @@ class FinanceTrackerGUI:
         ttk.Label(edit_dialog, text="Amount (₹):").grid(row=1, column=0, padx=5, pady=5, sticky=tk.E)
         amount_entry = ttk.Entry(edit_dialog)
         amount_entry.grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
-        amount_entry.insert(0, original_txn['amount'])
+        amount_entry.insert(0, original_txn.amount)
         
         ttk.Label(edit_dialog, text="Description:").grid(row=2, column=0, padx=5, pady=5, sticky=tk.E)
         desc_entry = ttk.Entry(edit_dialog)
         desc_entry.grid(row=2, column=1, padx=5, pady=5, sticky=tk.W)
-        desc_entry.insert(0, original_txn['description'])
+        desc_entry.insert(0, original_txn.description)
         
         ttk.Label(edit_dialog, text="Date (YYYY-MM-DD):").grid(row=3, column=0, padx=5, pady=5, sticky=tk.E)
         date_entry = ttk.Entry(edit_dialog)
         date_entry.grid(row=3, column=1, padx=5, pady=5, sticky=tk.W)
-        date_entry.insert(0, original_txn['date'].strftime('%Y-%m-%d') if hasattr(original_txn['date'], 'strftime') else original_txn['date'])
+        date_entry.insert(0, format_day(original_txn.date))
         
         ttk.Label(edit_dialog, text="Category:").grid(row=4, column=0, padx=5, pady=5, sticky=tk.E)
         category_var = tk.StringVar()
-        categories = sorted(set(t['category'] for t in self.ft.txns))
+        categories = self.ft.used_categories()
         category_combo = ttk.Combobox(
             edit_dialog, 
             textvariable=category_var,
             values=categories
         )
         category_combo.grid(row=4, column=1, padx=5, pady=5, sticky=tk.W)
-        category_var.set(original_txn['category'])
+        category_var.set(original_txn.category)
         
         def save_changes():
             try:
@@ -485,14 +565,14 @@ class FinanceTrackerGUI:
                     if not confirm:
                         return
                 
-                # Update the transaction
-                original_txn['amount'] = new_amount
-                original_txn['description'] = new_desc
-                original_txn['date'] = new_date
-                original_txn['category'] = new_category
-                
-                # Save changes
-                self.ft._save_user_transactions()
+                # Update and save the transaction
+                self.ft.update_transaction(
+                    original_txn.id,
+                    amount=new_amount,
+                    description=new_desc,
+                    date=new_date,
+                    category=new_category
+                )
                 messagebox.showinfo("Success", "Transaction updated successfully!")
                 edit_dialog.destroy()
                 self.update_transaction_table()
@@ -671,7 +751,7 @@ class FinanceTrackerGUI:
         for widget in self.graph_canvas_frame.winfo_children():
             widget.destroy()
             
-        if not self.ft.txns:
+        if not self.ft.aggregates.count:
             ttk.Label(self.graph_canvas_frame, text="No transactions to display").pack()
             return
             
@@ -713,7 +793,8 @@ class FinanceTrackerGUI:
         
         ttk.Label(anomaly_frame, text="Anomaly Detection", style='Header.TLabel').pack(pady=(0, 10))
         
-        anomalies = self.ft.detect_anomalies()
+        # Scored as each transaction was added; nothing is recomputed here
+        anomalies = self.ft.flagged_anomalies()
         if not anomalies:
             ttk.Label(anomaly_frame, text="No unusual transactions found").pack()
             return
@@ -735,11 +816,12 @@ class FinanceTrackerGUI:
             )
             anomaly_item.pack(fill=tk.X, pady=5)
             
-            date_str = anomaly['date'].strftime('%Y-%m-%d') if hasattr(anomaly['date'], 'strftime') else anomaly['date']
+            date_str = format_day(anomaly.date)
             ttk.Label(anomaly_item, text=f"Date: {date_str}").pack(anchor=tk.W)
-            ttk.Label(anomaly_item, text=f"Amount: ₹{anomaly['amount']:,.2f}").pack(anchor=tk.W)
-            ttk.Label(anomaly_item, text=f"Category: {anomaly['category']}").pack(anchor=tk.W)
-            ttk.Label(anomaly_item, text=f"Description: {anomaly['description']}").pack(anchor=tk.W)
+            ttk.Label(anomaly_item, text=f"Amount: ₹{anomaly.amount:,.2f}").pack(anchor=tk.W)
+            ttk.Label(anomaly_item, text=f"Category: {anomaly.category}").pack(anchor=tk.W)
+            ttk.Label(anomaly_item, text=f"Description: {anomaly.description}").pack(anchor=tk.W)
+            ttk.Label(anomaly_item, text=f"Score: {anomaly.score:+.1f} std. dev.").pack(anchor=tk.W)
             
             # Action buttons
             action_frame = ttk.Frame(anomaly_item)
@@ -760,38 +842,23 @@ class FinanceTrackerGUI:
     def change_anomaly_category(self, anomaly):
         new_category = simpledialog.askstring(
             "Change Category",
-            f"New category for transaction on {anomaly['date']}:\n{anomaly['description']}",
+            f"New category for transaction on {format_day(anomaly.date)}:\n{anomaly.description}",
             parent=self.root
         )
         
         if new_category and new_category.strip():
-            # Find and update the transaction
-            for txn in self.ft.txns:
-                if (txn['description'] == anomaly['description'] and 
-                    txn['date'] == anomaly['date'] and 
-                    txn['amount'] == anomaly['amount']):
-                    txn['category'] = new_category.strip()
-                    break
-            
-            self.ft._save_user_transactions()
+            self.ft.update_transaction(anomaly.id, category=new_category.strip())
             messagebox.showinfo("Success", "Category updated successfully")
             self.show_anomalies()
     
     def delete_anomaly(self, anomaly):
         confirm = messagebox.askyesno(
             "Confirm Delete",
-            f"Delete transaction on {anomaly['date']}:\n{anomaly['description']}\nAmount: ₹{anomaly['amount']:,.2f}?"
+            f"Delete transaction on {format_day(anomaly.date)}:\n{anomaly.description}\nAmount: ₹{anomaly.amount:,.2f}?"
         )
         
         if confirm:
-            # Remove the transaction
-            self.ft.txns = [
-                txn for txn in self.ft.txns 
-                if not (txn['description'] == anomaly['description'] and 
-                       txn['date'] == anomaly['date'] and 
-                       txn['amount'] == anomaly['amount'])
-            ]
-            self.ft._save_user_transactions()
+            self.ft.delete_transactions([anomaly.id])
             messagebox.showinfo("Success", "Transaction deleted")
             self.show_anomalies()
     
@@ -865,16 +932,59 @@ class FinanceTrackerGUI:
         
         if not filepath:
             return
+        
+        # Progress dialog; the import itself runs on a worker thread
+        progress_dialog = tk.Toplevel(self.root)
+        progress_dialog.title("Importing")
+        progress_dialog.transient(self.root)
+        progress_dialog.grab_set()
+        progress_dialog.protocol("WM_DELETE_WINDOW", lambda: None)
+        
+        ttk.Label(progress_dialog, text=f"Importing {os.path.basename(filepath)}...").pack(padx=20, pady=(15, 5))
+        progress_bar = ttk.Progressbar(progress_dialog, length=300, maximum=100)
+        progress_bar.pack(padx=20, pady=5)
+        status_label = ttk.Label(progress_dialog, text="0 rows processed")
+        status_label.pack(padx=20, pady=(0, 15))
+        
+        state = {'rows': 0, 'fraction': 0.0, 'done': False, 'result': False, 'error': None}
+        
+        def on_progress(rows, fraction):
+            state['rows'], state['fraction'] = rows, fraction
+        
+        def worker():
+            try:
+                state['result'] = self.ft.import_csv(filepath, progress=on_progress)
+            except Exception as e:
+                state['error'] = e
+            finally:
+                state['done'] = True
+        
+        def poll():
+            progress_bar['value'] = state['fraction'] * 100
+            status_label.config(text=f"{state['rows']:,} rows processed")
+            if not state['done']:
+                self.root.after(100, poll)
+                return
             
-        try:
-            if self.ft.import_csv(filepath):
-                messagebox.showinfo("Success", f"Imported {len(self.ft.txns)} transactions")
+            progress_dialog.destroy()
+            if state['error'] is not None:
+                messagebox.showerror("Error", f"Import failed: {str(state['error'])}")
+            elif state['result']:
+                report = self.ft.last_import_report
+                message = f"Imported {report['imported']} transactions"
+                if report['rejected']:
+                    message += f"\n{report['rejected']} invalid rows skipped (see {report['report_file']})"
+                messagebox.showinfo("Success", message)
                 self.show_dashboard()
-        except Exception as e:
-            messagebox.showerror("Error", f"Import failed: {str(e)}")
+            else:
+                messagebox.showerror("Error", "Import failed. CSV needs amount, description, date columns")
+        
+        self._import_thread = threading.Thread(target=worker, daemon=True)
+        self._import_thread.start()
+        poll()
     
     def export_csv(self, protected=False):
-        if not self.ft.txns:
+        if not self.ft.aggregates.count:
             messagebox.showwarning("Warning", "No transactions to export")
             return
             
@@ -931,14 +1041,53 @@ class FinanceTrackerGUI:
             messagebox.showerror("Error", f"Export failed: {str(e)}")
     
     def logout(self):
-        self.ft.user_manager.logout()
-        self.root.destroy()
-        messagebox.showinfo("Logged Out", "You have been logged out successfully")
+        self._end_session(lambda: messagebox.showinfo("Logged Out", "You have been logged out successfully"))
+    
+    def on_close(self):
+        # Write out queued changes before the window goes away
+        self._end_session()
+    
+    def _end_session(self, on_done=None):
+        if self._closing:
+            return
+        if self._import_thread is not None and self._import_thread.is_alive():
+            # The import still records its rows; logging out now would lose them
+            messagebox.showwarning("Import Running", "Please wait for the CSV import to finish")
+            return
+        self._closing = True
+        
+        # Queued changes are written at once; compaction and snapshots run on a worker
+        progress_dialog = tk.Toplevel(self.root)
+        progress_dialog.title("Saving")
+        progress_dialog.transient(self.root)
+        progress_dialog.grab_set()
+        progress_dialog.protocol("WM_DELETE_WINDOW", lambda: None)
+        
+        ttk.Label(progress_dialog, text="Saving your data...").pack(padx=20, pady=(15, 5))
+        progress_bar = ttk.Progressbar(progress_dialog, length=300, mode='indeterminate')
+        progress_bar.pack(padx=20, pady=(5, 15))
+        progress_bar.start(10)
+        
+        future = self.ft.user_manager.logout_async()
+        
+        def poll():
+            if not future.done():
+                self.root.after(100, poll)
+                return
+            
+            if future.exception() is not None:
+                messagebox.showerror("Error", f"Saving failed: {str(future.exception())}")
+            self.root.destroy()
+            if on_done:
+                on_done()
+        
+        poll()
 
 class LoginGUI:
     def __init__(self, root, user_manager):
         self.root = root
         self.user_manager = user_manager
+        self._pending = None  # in-flight authentication future
         self.setup_login_window()
         
     def setup_login_window(self):
@@ -975,7 +1124,8 @@ class LoginGUI:
         button_frame = ttk.Frame(main_frame)
         button_frame.pack(pady=10)
         
-        ttk.Button(button_frame, text="Login", command=self.login).pack(side=tk.LEFT, padx=5)
+        self.login_button = ttk.Button(button_frame, text="Login", command=self.login)
+        self.login_button.pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Sign Up", command=self.show_signup).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Exit", command=self.root.quit).pack(side=tk.LEFT, padx=5)
         
@@ -994,8 +1144,32 @@ class LoginGUI:
             self.status_label.config(text="Username and password required")
             return
             
-        result = self.user_manager.verify_user(username, password)
+        if self._pending is not None:
+            return
+        
+        # Hash verification runs on the auth worker pool; poll for the result
+        self.login_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Authenticating...")
+        self._await(self.user_manager.verify_user_async(username, password), self._on_login_result)
+    
+    def _await(self, future, callback):
+        """Poll a future from the Tk event loop and hand its result to callback"""
+        self._pending = future
+        
+        def poll():
+            if not future.done():
+                self.root.after(50, poll)
+                return
+            self._pending = None
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+            callback(result)
         
+        poll()
+    
+    def _on_login_result(self, result):
         if result['status'] == 'success':
             self.root.destroy()
             root = tk.Tk()
@@ -1003,6 +1177,7 @@ class LoginGUI:
             FinanceTrackerGUI(root, finance_tracker)
             root.mainloop()
         else:
+            self.login_button.config(state=tk.NORMAL)
             self.status_label.config(text=result.get('message', 'Login failed'))
     
     def show_signup(self):
@@ -1035,7 +1210,8 @@ class LoginGUI:
         button_frame = ttk.Frame(signup_window)
         button_frame.pack(pady=10)
         
-        ttk.Button(button_frame, text="Create Account", command=self.create_account).pack(side=tk.LEFT, padx=5)
+        self.create_button = ttk.Button(button_frame, text="Create Account", command=self.create_account)
+        self.create_button.pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Cancel", command=signup_window.destroy).pack(side=tk.LEFT, padx=5)
         
         # Status label
@@ -1078,22 +1254,39 @@ class LoginGUI:
             self.signup_status_label.config(text="Password must contain a special character")
             return
             
-        # Create the account
-        result = self.user_manager.create_user(username, password)
+        if self._pending is not None:
+            return
+        
+        # Create the account (password hashing runs on the auth worker pool)
+        self.create_button.config(state=tk.DISABLED)
+        self.signup_status_label.config(text="Creating account...")
+        self._await(
+            self.user_manager.create_user_async(username, password),
+            lambda result: self._on_account_created(username, result)
+        )
+    
+    def _on_account_created(self, username, result):
+        # The sign-up window may have been closed while hashing
+        signup_open = self.new_username_entry.winfo_exists()
+        if signup_open:
+            self.create_button.config(state=tk.NORMAL)
         
         if result['status'] == 'success':
             messagebox.showinfo("Success", "Account created successfully! Please login.")
-            self.new_username_entry.delete(0, tk.END)
-            self.new_password_entry.delete(0, tk.END)
-            self.confirm_password_entry.delete(0, tk.END)
-            self.signup_status_label.config(text="")
+            if signup_open:
+                self.new_username_entry.delete(0, tk.END)
+                self.new_password_entry.delete(0, tk.END)
+                self.confirm_password_entry.delete(0, tk.END)
+                self.signup_status_label.config(text="")
             self.username_entry.delete(0, tk.END)
             self.password_entry.delete(0, tk.END)
             self.username_entry.insert(0, username)
             self.password_entry.focus()
             self.root.focus()
-        else:
+        elif signup_open:
             self.signup_status_label.config(text=result.get('message', 'Account creation failed'))
+        else:
+            messagebox.showerror("Error", result.get('message', 'Account creation failed'))
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,198 @@
+import os
+import json
+import gzip
+import hashlib
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Dict, Iterable, Optional
+from storage import replace_file, write_json_atomic, read_json
+
+
+class HistoryStore:
+    """Versioned, deduplicated history of a user's transactions
+
+    Each version is a manifest of content-addressed chunks. A chunk ends
+    after every transaction whose ID hashes to 0 modulo `chunk_size`, so
+    boundaries depend on the records rather than their positions: inserting
+    or deleting a record only changes the chunk it is in. Every chunk is
+    stored once under its SHA-256, so versions that only append or touch a
+    few records share all unchanged chunks with their predecessors.
+
+    Digests of the last committed chunks are remembered by their record
+    IDs, so a later commit only serializes chunks with added, removed or
+    invalidate()d records.
+    """
+
+    def __init__(self, root: str, chunk_size: int = 1024,
+                 max_versions: int = 30, max_age_days: int = 90, default=None,
+                 fsync: bool = True):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.index_path = os.path.join(root, 'index.json')
+        self.chunk_size = chunk_size
+        self.max_versions = max_versions  # newest versions retained
+        self.max_age_days = max_age_days  # older versions are evicted (latest always kept)
+        self.default = default  # json.dumps hook for non-dict records
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._digests = {}  # tuple of record IDs -> digest of that chunk as last committed
+        self._chunk_of = {}  # record ID -> its key in _digests
+        self._dirty = set()  # IDs of records changed since they were last committed
+        self._resets = 0  # invalidate() calls without IDs
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.chmod(self.root, 0o700)
+        os.chmod(self.objects_dir, 0o700)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, f"{digest}.json.gz")
+
+    def _load_index(self) -> List[Dict]:
+        try:
+            return read_json(self.index_path)
+        except FileNotFoundError:
+            return []
+
+    def _save_index(self, versions: List[Dict]):
+        write_json_atomic(self.index_path, versions, fsync=self.fsync, backup=True)
+
+    def _put_chunk(self, chunk: list) -> str:
+        """Store a chunk if its content is new and return its digest"""
+        payload = json.dumps(chunk, sort_keys=True, separators=(',', ':'),
+                             default=self.default).encode('utf-8')
+        digest = hashlib.sha256(payload).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            # Written under a temp name so a crash never leaves a torn chunk
+            replace_file(path, gzip.compress(payload), fsync=self.fsync)
+        return digest
+
+    @staticmethod
+    def _record_id(record) -> str:
+        return str(record['id'] if isinstance(record, dict) else record.id)
+
+    def _split(self, transactions: list) -> List[list]:
+        """Cut after every record whose ID hash is 0 modulo chunk_size"""
+        chunks, start = [], 0
+        for i, record in enumerate(transactions):
+            if zlib.crc32(self._record_id(record).encode('utf-8')) % self.chunk_size == 0:
+                chunks.append(transactions[start:i + 1])
+                start = i + 1
+        if start < len(transactions):
+            chunks.append(transactions[start:])
+        return chunks
+
+    def invalidate(self, ids: Iterable[str] = None):
+        """Mark records as changed in place, so their chunks are stored again
+
+        Without `ids` every remembered digest is dropped.
+        """
+        with self._cache_lock:
+            if ids is None:
+                self._digests, self._chunk_of = {}, {}
+                self._resets += 1
+            else:
+                self._dirty.update(ids)
+
+    def _drop_dirty(self):
+        """Forget the digests of chunks holding changed records (cache lock held)"""
+        for txn_id in self._dirty:
+            self._digests.pop(self._chunk_of.get(txn_id), None)
+
+    def commit(self, transactions: list) -> Optional[int]:
+        """Record a new version; returns its number, or None if unchanged"""
+        with self._lock:
+            with self._cache_lock:
+                self._drop_dirty()
+                self._dirty = set()
+                digests, resets = self._digests, self._resets
+            keys, chunks = [], []
+            for chunk in self._split(transactions):
+                key = tuple(map(self._record_id, chunk))
+                keys.append(key)
+                chunks.append(digests.get(key) or self._put_chunk(chunk))
+            version = self._append_version(chunks, len(transactions))
+
+            with self._cache_lock:
+                if resets == self._resets:
+                    self._digests = dict(zip(keys, chunks))
+                    self._chunk_of = {txn_id: key for key in keys for txn_id in key}
+                    self._drop_dirty()  # records changed while this commit ran
+            return version
+
+    def _append_version(self, chunks: List[str], count: int) -> Optional[int]:
+        versions = self._load_index()
+        if versions and versions[-1]['chunks'] == chunks:
+            return None
+
+        version = versions[-1]['version'] + 1 if versions else 1
+        versions.append({
+            'version': version,
+            'timestamp': datetime.now().isoformat(),
+            'count': count,
+            'chunks': chunks
+        })
+        kept = self._evict(versions)
+        # The index is replaced before chunks go, so it never names a missing chunk
+        self._save_index(kept)
+        if len(kept) < len(versions):
+            self._collect(kept)
+        return version
+
+    def versions(self) -> List[Dict]:
+        """List retained versions (oldest first) without loading their data"""
+        return [
+            {k: v for k, v in entry.items() if k != 'chunks'}
+            for entry in self._load_index()
+        ]
+
+    def load(self, version: int = None) -> list:
+        """Reconstruct the transactions of a version (latest by default)"""
+        versions = self._load_index()
+        if not versions:
+            return []
+        entry = versions[-1] if version is None else next(
+            (v for v in versions if v['version'] == version), None)
+        if entry is None:
+            raise ValueError(f"Version {version} not retained")
+
+        transactions = []
+        for digest in entry['chunks']:
+            with gzip.open(self._object_path(digest), 'rb') as f:
+                transactions.extend(json.loads(f.read().decode('utf-8')))
+        return transactions
+
+    def _evict(self, versions: List[Dict]) -> List[Dict]:
+        """Apply the retention policy, returning the versions to keep"""
+        cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+        kept = [v for v in versions[-self.max_versions:] if v['timestamp'] >= cutoff]
+        return kept or versions[-1:]
+
+    def _collect(self, kept: List[Dict]):
+        """Delete chunks no longer referenced by any kept version"""
+        live = {digest for v in kept for digest in v['chunks']}
+        for name in os.listdir(self.objects_dir):
+            if name.endswith('.json.gz') and name[:-len('.json.gz')] not in live:
+                os.remove(os.path.join(self.objects_dir, name))
+
+
+def prune_legacy_snapshots(data_dir: str, keep: int = 0) -> int:
+    """Remove old per-save session_*.json / transactions_*.csv files
+
+    Legacy session files embed the password hash, so once their data is in
+    the history none are kept by default.
+    """
+    if not os.path.isdir(data_dir):
+        return 0
+
+    removed = 0
+    for prefix, suffix in (('session_', '.json'), ('transactions_', '.csv')):
+        legacy = sorted(
+            name for name in os.listdir(data_dir)
+            if name.startswith(prefix) and name.endswith(suffix)
+        )
+        for name in legacy[:max(len(legacy) - keep, 0)]:
+            os.remove(os.path.join(data_dir, name))
+            removed += 1
+    return removed
@@ -0,0 +1,456 @@
+import os
+import json
+import uuid
+import shutil
+import sqlite3
+import sys
+import time
+import threading
+from typing import List, Callable
+
+import numpy as np
+
+from dates import parse_day, format_day
+from transaction import Transaction, CategoryDictionary
+
+
+def new_transaction_id() -> str:
+    """Generate a persistent unique transaction ID"""
+    return uuid.uuid4().hex
+
+
+def new_transaction_ids(count: int) -> List[str]:
+    """`count` IDs in the new_transaction_id() format from a single urandom call"""
+    raw = np.frombuffer(os.urandom(16 * count), dtype=np.uint8).reshape(count, 16).copy()
+    raw[:, 6] = raw[:, 6] & 0x0F | 0x40  # version 4
+    raw[:, 8] = raw[:, 8] & 0x3F | 0x80  # RFC 4122 variant
+    hexed = raw.tobytes().hex()
+    return [hexed[i:i + 32] for i in range(0, 32 * count, 32)]
+
+
+def fsync_dir(path: str):
+    """Make a rename in a directory durable (no-op where unsupported)"""
+    try:
+        fd = os.open(path or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def replace_file(path: str, data, fsync: bool = True, backup: bool = False):
+    """Atomically replace a file's contents: temp file, fsync, os.replace
+
+    Readers see either the old or the new file, never a torn one. With backup
+    the previous generation is kept as <path>.bak; it is hard-linked before
+    the swap so `path` itself never goes missing.
+    """
+    tmp = f"{path}.tmp"
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    with open(tmp, mode) as f:
+        f.write(data)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.chmod(tmp, 0o600)
+
+    if backup and os.path.exists(path):
+        bak, bak_tmp = f"{path}.bak", f"{path}.bak.tmp"
+        try:
+            if os.path.exists(bak_tmp):
+                os.remove(bak_tmp)
+            os.link(path, bak_tmp)
+            os.replace(bak_tmp, bak)
+        except OSError:
+            shutil.copy2(path, bak)
+
+    os.replace(tmp, path)
+    if fsync:
+        fsync_dir(os.path.dirname(path))
+
+
+def write_json_atomic(path: str, document, default=None, fsync: bool = True,
+                      backup: bool = False):
+    """Serialize compactly (C encoder) and atomically replace a JSON file"""
+    replace_file(path, json.dumps(document, separators=(',', ':'), default=default),
+                 fsync=fsync, backup=backup)
+
+
+def read_json(path: str):
+    """Load a JSON file, falling back to its .bak generation if unreadable"""
+    for candidate in (path, f"{path}.bak"):
+        try:
+            with open(candidate, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            continue
+        except ValueError as e:
+            print(f"Ignoring unreadable {candidate}: {e}")
+    raise FileNotFoundError(path)
+
+
+class TransactionJournal:
+    """Append-only log of transaction mutations for a single user"""
+
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync  # one fsync per appended batch (group commit)
+        self._lock = threading.Lock()
+        self.last_seq = 0
+        self.pending = 0
+        for record in self._read_records():
+            self.last_seq = max(self.last_seq, record.get('seq', 0))
+            self.pending += 1
+
+    def _read_records(self) -> list:
+        """Read all intact records, ignoring a torn trailing line"""
+        if not os.path.exists(self.path):
+            return []
+
+        records = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+
+    def append_many(self, mutations: List[tuple]) -> int:
+        """Append (op, payload) records with one write; returns the last sequence number"""
+        with self._lock:
+            lines = []
+            for op, payload in mutations:
+                self.last_seq += 1
+                record = {'seq': self.last_seq, 'op': op, **payload}
+                lines.append(json.dumps(record, default=Transaction.to_record) + '\n')
+            created = not os.path.exists(self.path)
+            with open(self.path, 'a') as f:
+                f.write(''.join(lines))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            if created:
+                os.chmod(self.path, 0o600)
+            self.pending += len(lines)
+            return self.last_seq
+
+    def replay(self, records: dict, after_seq: int = 0,
+               categories: CategoryDictionary = None) -> dict:
+        """Apply journaled mutations newer than after_seq to an ID->record map"""
+        for record in self._read_records():
+            if record.get('seq', 0) > after_seq:
+                self.apply(records, self.decode(record, categories))
+                self.last_seq = max(self.last_seq, record['seq'])
+        return records
+
+    def discard_through(self, seq: int):
+        """Drop records already folded into a snapshot, keeping newer ones"""
+        with self._lock:
+            remaining = [r for r in self._read_records() if r.get('seq', 0) > seq]
+            replace_file(self.path, ''.join(json.dumps(r) + '\n' for r in remaining),
+                         fsync=self.fsync)
+            self.pending = len(remaining)
+
+    @staticmethod
+    def decode(record: dict, categories: CategoryDictionary = None) -> dict:
+        """Turn the transactions of a journal line back into Transaction objects"""
+        if 'txn' in record:
+            record['txn'] = Transaction.from_record(record['txn'], categories)
+        if 'txns' in record:
+            record['txns'] = [Transaction.from_record(t, categories) for t in record['txns']]
+        return record
+
+    @staticmethod
+    def apply(records: dict, record: dict):
+        """Apply one decoded mutation record to an ID->Transaction map in place"""
+        op = record['op']
+        if op in ('add', 'update'):
+            records[record['txn'].id] = record['txn']
+        elif op == 'extend':
+            records.update((txn.id, txn) for txn in record['txns'])
+        elif op == 'delete':
+            for txn_id in record['ids']:
+                records.pop(txn_id, None)
+        else:
+            raise ValueError(f"Unknown journal operation: {op}")
+
+
+class JsonTransactionStore:
+    """Default backend: transactions live in the user snapshot plus the journal
+
+    Records are kept in an insertion-ordered ID map, so journaled updates and
+    deletes apply in O(1). The map holds the same Transaction objects as the
+    caller, so nothing is copied per save.
+
+    When opened from snapshot columns the map is only built on first use;
+    until then single rows are materialized a page at a time. The columns
+    stay available for analytics until the data changes.
+    """
+
+    PAGE_SIZE = 4096  # snapshot rows materialized together
+
+    def __init__(self, transactions: list, categories: List[str] = None, columns=None):
+        """Build from JSON records and category names as read from latest_data.json"""
+        self._records = {} if columns is None else None
+        self._pages = {}  # page number -> Transactions of not yet materialized snapshots
+        self._row_list = None  # (version, records in row order) once materialized
+        self.columns = columns  # TransactionColumns of the snapshot, if any
+        self._columns_version = 0
+        self.version = 0  # bumped by every change
+        self.category_dictionary = CategoryDictionary(categories or ())
+        for record in transactions:
+            txn = Transaction.from_record(record, self.category_dictionary)
+            if not txn.id:
+                txn.id = new_transaction_id()
+            self.records[txn.id] = txn
+
+    @property
+    def records(self) -> dict:
+        """ID -> Transaction map, materialized from the snapshot columns on first use"""
+        if self._records is None:
+            pages = range(-(-len(self.columns) // self.PAGE_SIZE))
+            self._records = {txn.id: txn for page in pages for txn in self._page(page)}
+            self._pages = {}
+        return self._records
+
+    def _page(self, page: int) -> List[Transaction]:
+        txns = self._pages.get(page)
+        if txns is None:
+            start = page * self.PAGE_SIZE
+            txns = self._pages[page] = self.columns.transactions(
+                self.category_dictionary, start, start + self.PAGE_SIZE)
+        return txns
+
+    def transactions_at(self, rows) -> List[Transaction]:
+        """Records at snapshot row positions, materializing only their pages
+
+        Only meaningful while snapshot_columns() is current.
+        """
+        if self._records is not None:
+            if self._row_list is None or self._row_list[0] != self.version:
+                self._row_list = (self.version, list(self._records.values()))
+            txns = self._row_list[1]
+            return [txns[row] for row in rows]
+        size = self.PAGE_SIZE
+        return [self._page(row // size)[row % size] for row in rows]
+
+    @property
+    def materialized(self) -> bool:
+        return self._records is not None
+
+    def snapshot_columns(self):
+        """The snapshot's TransactionColumns if they match the current records, else None"""
+        if self.columns is not None and self._columns_version == self.version:
+            return self.columns
+        return None
+
+    def attach_columns(self, columns, version: int):
+        """Adopt freshly written snapshot columns unless the data changed since `version`"""
+        if version == self.version:
+            self.columns = columns
+            self._columns_version = version
+
+    def replay(self, journal: 'TransactionJournal', after_seq: int = 0):
+        """Apply journaled mutations newer than the snapshot"""
+        if journal.last_seq > after_seq:
+            journal.replay(self.records, after_seq, self.category_dictionary)
+            self.version += 1
+
+    def load(self, username: str) -> List[Transaction]:
+        return list(self.records.values())
+
+    def apply(self, username: str, op: str, **payload):
+        TransactionJournal.apply(self.records, {'op': op, **payload})
+        self.version += 1
+
+    def replace_all(self, username: str, transactions: List[Transaction]):
+        self._records = {txn.id: txn for txn in transactions}
+        self.version += 1
+
+    def close(self):
+        pass
+
+
+class SQLiteTransactionStore:
+    """Embedded SQLite backend: persists mutations as indexed SQL rows
+
+    Only used for storage; filters and totals are answered in memory by
+    FinanceTracker like with the JSON backend, so rows are only indexed by
+    (username, txn_id) for loads and per-record updates.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            txn_id TEXT,
+            username TEXT NOT NULL,
+            date TEXT NOT NULL,
+            description TEXT NOT NULL,
+            amount REAL NOT NULL,
+            category TEXT NOT NULL
+        );
+        DROP INDEX IF EXISTS idx_txn_user_date;
+        DROP INDEX IF EXISTS idx_txn_user_category;
+    """
+    COLUMNS = ('txn_id', 'date', 'description', 'amount', 'category')
+    INSERT = ("INSERT INTO transactions (txn_id, date, description, amount, category, username) "
+              "VALUES (?, ?, ?, ?, ?, ?)")
+
+    def __init__(self, path: str):
+        created = not os.path.exists(path)
+        self._lock = threading.Lock()
+        self.category_dictionary = CategoryDictionary()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        columns = [r[1] for r in self.conn.execute("PRAGMA table_info(transactions)")]
+        if columns and 'txn_id' not in columns:
+            self.conn.execute("ALTER TABLE transactions ADD COLUMN txn_id TEXT")
+        self.conn.executescript(self.SCHEMA)
+        self.conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_txn_user_id ON transactions (username, txn_id)")
+        if created:
+            os.chmod(path, 0o600)
+
+    @staticmethod
+    def _row(txn: Transaction) -> tuple:
+        return (txn.id, format_day(txn.date), txn.description, txn.amount, txn.category)
+
+    def _to_transaction(self, row) -> Transaction:
+        return Transaction(row['txn_id'], row['amount'], sys.intern(row['description']),
+                           parse_day(row['date']), self.category_dictionary.intern(row['category']))
+
+    def load(self, username: str) -> List[Transaction]:
+        with self._lock:
+            with self.conn:
+                # Rows written before IDs existed get one on first load
+                missing = self.conn.execute(
+                    "SELECT id FROM transactions WHERE username = ? AND txn_id IS NULL",
+                    (username,)
+                ).fetchall()
+                self.conn.executemany(
+                    "UPDATE transactions SET txn_id = ? WHERE id = ?",
+                    [(new_transaction_id(), r[0]) for r in missing]
+                )
+            rows = self.conn.execute(
+                "SELECT txn_id, date, description, amount, category FROM transactions "
+                "WHERE username = ? ORDER BY id", (username,)
+            ).fetchall()
+        return [self._to_transaction(r) for r in rows]
+
+    def apply(self, username: str, op: str, **payload):
+        """Persist one mutation record"""
+        self.apply_many(username, [(op, payload)])
+
+    def apply_many(self, username: str, mutations: List[tuple]):
+        """Persist (op, payload) mutation records in a single SQL transaction"""
+        with self._lock, self.conn:
+            for op, payload in mutations:
+                self._apply(username, op, payload)
+
+    def _apply(self, username: str, op: str, payload: dict):
+        if op == 'add':
+            self.conn.execute(self.INSERT, (*self._row(payload['txn']), username))
+        elif op == 'extend':
+            self.conn.executemany(self.INSERT, [(*self._row(t), username) for t in payload['txns']])
+        elif op == 'update':
+            txn = payload['txn']
+            self.conn.execute(
+                "UPDATE transactions SET date = ?, description = ?, amount = ?, category = ? "
+                "WHERE username = ? AND txn_id = ?",
+                (*self._row(txn)[1:], username, txn.id)
+            )
+        elif op == 'delete':
+            self.conn.executemany(
+                "DELETE FROM transactions WHERE username = ? AND txn_id = ?",
+                [(username, txn_id) for txn_id in payload['ids']]
+            )
+        else:
+            raise ValueError(f"Unknown storage operation: {op}")
+
+    def replace_all(self, username: str, transactions: List[Transaction]):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM transactions WHERE username = ?", (username,))
+            self.conn.executemany(self.INSERT, [(*self._row(t), username) for t in transactions])
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class WriteBehind:
+    """Background writer that coalesces bursts of changes into one write
+
+    mark_dirty() only records that a write is needed. The writer thread waits
+    until no change has arrived for `delay` seconds, but never longer than
+    `max_delay` after the first unsaved change, then calls `write` once.
+    """
+
+    def __init__(self, write: Callable[[], bool], delay: float = 0.5, max_delay: float = 2.0):
+        self.write = write
+        self.delay = delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._first_dirty = None
+        self._last_dirty = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def dirty(self) -> bool:
+        return self._first_dirty is not None
+
+    def mark_dirty(self):
+        with self._cond:
+            now = time.monotonic()
+            if self._first_dirty is None:
+                self._first_dirty = now
+            self._last_dirty = now
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._first_dirty is None:
+                        self._cond.wait()
+                        continue
+                    now = time.monotonic()
+                    due = min(self._last_dirty + self.delay, self._first_dirty + self.max_delay)
+                    if now >= due:
+                        break
+                    self._cond.wait(due - now)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self) -> bool:
+        """Write now if anything is pending (from any thread)"""
+        with self._write_lock:
+            with self._cond:
+                if self._first_dirty is None:
+                    return True
+                self._first_dirty = self._last_dirty = None
+            try:
+                saved = self.write()
+            except Exception as e:
+                print(f"Background save failed: {e}")
+                saved = False
+            if not saved:
+                self.mark_dirty()  # retried on the next round
+            return saved
+
+    def close(self) -> bool:
+        """Flush pending changes and stop the writer thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        return self.flush()
@@ -0,0 +1,91 @@
+import sys
+from typing import Dict, Iterable
+
+from dates import parse_day, format_day
+
+
+class CategoryDictionary:
+    """Per-user mapping between category names and small integer codes
+
+    Codes are assigned in first-seen order and never reused, so `names` is a
+    valid categories list for pd.Categorical.from_codes. Every record shares
+    the dictionary's single copy of each name.
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names = []
+        self.codes = {}
+        for name in names:
+            self.code(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def code(self, name: str) -> int:
+        code = self.codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self.names.append(name)
+            self.codes[name] = code
+        return code
+
+    def intern(self, name: str) -> str:
+        """The shared copy of a category name, registering it if new"""
+        return self.names[self.code(name)]
+
+    def name(self, code: int) -> str:
+        return self.names[code]
+
+
+class Transaction:
+    """A single transaction record
+
+    Uses __slots__ so each record is a fixed-field object instead of a dict.
+    The date is a day ordinal; records are converted to and from their JSON
+    form (YYYY-MM-DD date) only at the storage boundary. `score` is the
+    anomaly score given when the record was inserted (None if never scored).
+    """
+
+    FIELDS = ('id', 'amount', 'description', 'date', 'category')
+    __slots__ = FIELDS + ('score',)
+
+    def __init__(self, id: str, amount: float, description: str, date: int, category: str,
+                 score: float = None):
+        self.id = id
+        self.amount = amount
+        self.description = description
+        self.date = date
+        self.category = category
+        self.score = score
+
+    @classmethod
+    def from_record(cls, record: Dict, categories: CategoryDictionary = None) -> 'Transaction':
+        """Build from the JSON form (id may be missing on legacy records)
+
+        The category may be a name or, in dictionary-encoded files, a code
+        into `categories`. Descriptions are interned since they repeat a lot.
+        """
+        category = record['category']
+        if categories is not None:
+            category = categories.name(category) if isinstance(category, int) \
+                else categories.intern(category)
+        return cls(record.get('id'), record['amount'], sys.intern(record['description']),
+                   parse_day(record['date']), category, record.get('score'))
+
+    def to_record(self, categories: CategoryDictionary = None) -> Dict:
+        """JSON form of the record, with a category code if given a dictionary"""
+        record = {
+            'id': self.id,
+            'amount': self.amount,
+            'description': self.description,
+            'date': format_day(self.date),
+            'category': self.category if categories is None else categories.code(self.category)
+        }
+        if self.score is not None:
+            record['score'] = self.score
+        return record
+
+    def __repr__(self) -> str:
+        return (f"Transaction(id={self.id!r}, amount={self.amount!r}, "
+                f"description={self.description!r}, date={format_day(self.date)!r}, "
+                f"category={self.category!r})")
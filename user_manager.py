@@ -1,10 +1,16 @@
 import os
-import json
 import hashlib
 import binascii
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from datetime import datetime
-import pandas as pd
+from typing import List, Tuple
+from storage import (TransactionJournal, JsonTransactionStore, SQLiteTransactionStore, WriteBehind,
+                     write_json_atomic, read_json)
+from history import HistoryStore, prune_legacy_snapshots
+from columnar import ColumnarSnapshot, TransactionColumns
+from transaction import Transaction
 
 class UserManager:
     """Handles user authentication with persistent session storage"""
@@ -15,6 +21,24 @@ class UserManager:
         self.failed_attempts = {}
         self.session_timeout = 1800  # 30 minutes
         self.session_start = None
+        self.storage_backend = 'json'  # 'json' (latest_data.json) or 'sqlite'
+        self.storage_mode = 'journal'  # json backend: 'journal' or 'snapshot' (full rewrite per save)
+        self.snapshot_format = 'npy'  # json backend: 'npy' (memory-mapped), 'parquet', 'npz' or 'json'
+        self.journal_compact_threshold = 500  # journaled mutations before background compaction
+        self._journal = None
+        self.store = None
+        self._lock = threading.RLock()
+        self.save_delay = 0.5  # seconds without changes before queued writes go out
+        self.max_save_latency = 2.0  # longest a change may wait to be written
+        self._pending = []  # (op, payload) mutations not yet written
+        self._full_save = False
+        self._writer = None
+        self.fsync_writes = True  # fsync saves; each queued burst shares one fsync
+        self.history_max_versions = 30  # retained transaction history versions
+        self.history_max_age_days = 90
+        self._history = None  # the current user's HistoryStore, kept for its chunk digests
+        self.auth_workers = os.cpu_count() or 2  # parallel PBKDF2 computations
+        self._auth_executor = None
         os.makedirs(self.users_root, exist_ok=True)
         os.chmod(self.users_root, 0o700)
 
@@ -37,17 +61,140 @@ class UserManager:
 
     def _get_session_files(self, username: str) -> dict:
         """Generate paths for all session files"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         user_folder = self._get_user_folder(username)
         
         return {
-            'current_json': os.path.join(user_folder, 'data', f"session_{timestamp}.json"),
-            'current_csv': os.path.join(user_folder, 'data', f"transactions_{timestamp}.csv"),
+            'data_dir': os.path.join(user_folder, 'data'),
+            'history_dir': os.path.join(user_folder, 'data', 'history'),
+            'account': os.path.join(user_folder, 'account.json'),
             'latest_json': os.path.join(user_folder, 'latest_data.json'),
+            'journal': os.path.join(user_folder, 'journal.jsonl'),
+            'columns': os.path.join(user_folder, 'transactions'),
             'graphs_dir': os.path.join(user_folder, 'graphs'),
             'reports_dir': os.path.join(user_folder, 'reports')
         }
 
+    def get_history(self, username: str = None) -> HistoryStore:
+        """Versioned transaction history for a user (current user by default)
+
+        The current user's store lives for the session, so each commit only
+        stores the chunks that changed since the previous one.
+        """
+        current = self.current_user and self.current_user['username']
+        username = username or current
+        if username == current and self._history is not None:
+            return self._history
+        history = HistoryStore(
+            self._get_session_files(username)['history_dir'],
+            max_versions=self.history_max_versions,
+            max_age_days=self.history_max_age_days,
+            default=Transaction.to_record,
+            fsync=self.fsync_writes
+        )
+        if username == current:
+            self._history = history
+        return history
+
+    def _open_store(self, user_data: dict, journal: TransactionJournal):
+        """Open the configured transaction backend for a user
+
+        Transactions are moved out of user_data into the store, or the
+        columnar snapshot it points to is opened without materializing any
+        records. Journaled mutations newer than the snapshot are replayed on
+        top.
+        """
+        records = self._open_records(user_data, journal)
+        user_data['journal_seq'] = journal.last_seq
+
+        if self.storage_backend == 'sqlite':
+            store = SQLiteTransactionStore(os.path.join(self.users_root, 'transactions.db'))
+            if records.records:
+                # One-time migration of transactions previously kept in JSON
+                store.replace_all(user_data['username'], records.load(user_data['username']))
+            return store
+        return records
+
+    def _open_records(self, user_data: dict, journal: TransactionJournal) -> JsonTransactionStore:
+        """JSON store of latest_data.json content (or its columnar snapshot) plus the journal"""
+        snapshot = user_data.pop('snapshot', None)
+        if snapshot:
+            columns = ColumnarSnapshot(self._get_session_files(user_data['username'])['columns'],
+                                       snapshot).open()
+            records = JsonTransactionStore([], columns.categories, columns=columns)
+        else:
+            records = JsonTransactionStore(user_data.pop('transactions', []),
+                                           user_data.pop('categories', None))
+        records.replay(journal, after_seq=user_data.get('journal_seq', 0))
+        return records
+
+    def usernames(self) -> List[str]:
+        """Every user with saved data"""
+        return sorted(
+            name[len('user_'):] for name in os.listdir(self.users_root)
+            if name.startswith('user_')
+            and os.path.exists(os.path.join(self.users_root, name, 'latest_data.json'))
+        )
+
+    def user_columns(self, username: str) -> TransactionColumns:
+        """Read-only column view of any user's saved transactions, for batch jobs
+
+        No data is written and no session is opened; journaled changes not
+        yet compacted are included. JSON backend only.
+        """
+        if self.storage_backend != 'json':
+            raise ValueError("Batch reads need the JSON storage backend")
+        files = self._get_session_files(username)
+        journal = TransactionJournal(files['journal'], fsync=False)
+        records = self._open_records(read_json(files['latest_json']), journal)
+        columns = records.snapshot_columns()
+        if columns is None:
+            columns = TransactionColumns.from_transactions(records.load(username),
+                                                           records.category_dictionary)
+        return columns
+
+    def _user_document(self, user_data: dict = None) -> dict:
+        """Full latest_data.json content: account metadata plus transactions"""
+        user_data = user_data or self.current_user
+        if self.storage_backend == 'json':
+            # Categories follow the transactions so every code used is listed
+            return {
+                **user_data,
+                'transactions': self.store.load(user_data['username']),
+                'categories': self.store.category_dictionary.names,
+                'data_version': self.store.version
+            }
+        return {**user_data, 'transactions': []}
+
+    def _write_document(self, path: str, document: dict, columns: bool = True):
+        """Atomically write a latest_data.json document, keeping the last good one as .bak
+
+        With a columnar snapshot format the transactions go to their own
+        file first and the JSON keeps only session metadata and a pointer to
+        it; `columns=False` rewrites just the metadata.
+        """
+        categories = self.store.category_dictionary
+        version = document.pop('data_version', None)
+        if self.storage_backend == 'json':
+            base = self._get_session_files(document['username'])['columns']
+            if self.snapshot_format != 'json':
+                snapshot = ColumnarSnapshot(
+                    base, ColumnarSnapshot.available_format(self.snapshot_format))
+                if columns or not snapshot.exists():
+                    written = TransactionColumns.from_transactions(document['transactions'],
+                                                                   categories)
+                    snapshot.write(written, fsync=self.fsync_writes)
+                    if snapshot.format == 'npy':
+                        written = snapshot.open()  # page cache instead of private memory
+                    with self._lock:
+                        self.store.attach_columns(written, version)
+                document = {key: value for key, value in document.items()
+                            if key not in ('transactions', 'categories')}
+                document['snapshot'] = snapshot.format
+            else:
+                ColumnarSnapshot.remove(base)
+        write_json_atomic(path, document, default=lambda txn: txn.to_record(categories),
+                          fsync=self.fsync_writes, backup=True)
+
     def _hash_password(self, password: str) -> str:
         """Secure password hashing with PBKDF2-HMAC-SHA512"""
         salt = hashlib.sha256(os.urandom(60)).hexdigest().encode('ascii')
@@ -76,6 +223,46 @@ class UserManager:
         ).decode('ascii')
         return pwdhash == stored_pwd
 
+    def _executor(self) -> ThreadPoolExecutor:
+        """Worker pool for password hashing and logout saves
+
+        hashlib.pbkdf2_hmac releases the GIL, so hashing on threads keeps the
+        caller (e.g. the Tk event loop) responsive and scales across cores.
+        """
+        if self._auth_executor is None:
+            self._auth_executor = ThreadPoolExecutor(
+                max_workers=self.auth_workers, thread_name_prefix='auth')
+        return self._auth_executor
+
+    def verify_user_async(self, username: str, password: str) -> Future:
+        """Run verify_user on the worker pool; the future yields its result dict"""
+        return self._executor().submit(self.verify_user, username, password)
+
+    def create_user_async(self, username: str, password: str) -> Future:
+        """Run create_user on the worker pool; the future yields its result dict"""
+        return self._executor().submit(self.create_user, username, password)
+
+    def hash_passwords(self, passwords: List[str]) -> List[str]:
+        """Hash many passwords in parallel"""
+        return list(self._executor().map(self._hash_password, passwords))
+
+    def create_users(self, accounts: List[Tuple[str, str]]) -> List[dict]:
+        """Bulk-provision accounts, hashing their passwords in parallel"""
+        seen = set()
+        results = []
+        futures = []
+        for username, password in accounts:
+            key = username.lower().strip()
+            if key in seen:
+                results.append({"status": "error", "message": "Duplicate username in batch"})
+                futures.append(None)
+                continue
+            seen.add(key)
+            results.append(None)
+            futures.append(self.create_user_async(username, password))
+        return [result if future is None else future.result()
+                for result, future in zip(results, futures)]
+
     def create_user(self, username: str, password: str) -> dict:
         """Create new user with organized storage"""
         try:
@@ -84,23 +271,18 @@ class UserManager:
             if not (4 <= len(username) <= 20 and username.isalnum()):
                 return {"status": "error", "message": "Username must be 4-20 alphanumeric characters"}
             
-            user_folder = self._get_user_folder(username)
-            user_file = os.path.join(user_folder, 'latest_data.json')
-            if os.path.exists(user_file):
+            files = self._get_session_files(username)
+            if os.path.exists(files['account']) or os.path.exists(files['latest_json']):
                 return {"status": "error", "message": "Username already exists"}
             
-            user_data = {
+            # Credentials only; latest_data.json is created at first login
+            account = {
                 "username": username,
                 "password_hash": self._hash_password(password),
-                "created_at": datetime.now().isoformat(),
-                "last_login": None,
-                "transactions": [],
-                "transaction_history": []  # Added for complete history
+                "created_at": datetime.now().isoformat()
             }
             
-            with open(user_file, 'w') as f:
-                json.dump(user_data, f, indent=4)
-            os.chmod(user_file, 0o600)
+            write_json_atomic(files['account'], account, fsync=self.fsync_writes)
             
             return {"status": "success"}
         except Exception as e:
@@ -119,34 +301,69 @@ class UserManager:
             }
         
         try:
-            user_folder = self._get_user_folder(username)
-            latest_file = os.path.join(user_folder, 'latest_data.json')
-            
-            if not os.path.exists(latest_file):
-                return {"status": "error", "message": "Username not found"}
-            
-            with open(latest_file, 'r') as f:
-                user_data = json.load(f)
-                
-                if not self._verify_password(user_data['password_hash'], password):
-                    self.failed_attempts[username] = (attempts + 1, time.time())
-                    return {"status": "error", "message": "Incorrect password"}
-                
-                # Update user data
-                user_data['last_login'] = datetime.now().isoformat()
-                self.current_user = user_data
-                self.session_start = time.time()
-                
-                # Save updated data (only metadata changes)
-                with open(latest_file, 'w') as f:
-                    json.dump(user_data, f, indent=4)
-                
-                return {"status": "success", "user_data": user_data}
-                
+            files = self._get_session_files(username)
+            latest_file = files['latest_json']
+            
+            try:
+                # Falls back to the last good generation if the file is damaged
+                account = read_json(files['account'])
+                migrate = False
+            except FileNotFoundError:
+                # Legacy account: credentials still inside latest_data.json
+                try:
+                    legacy = read_json(latest_file)
+                except FileNotFoundError:
+                    return {"status": "error", "message": "Username not found"}
+                account = {key: legacy[key] for key in ('username', 'password_hash', 'created_at')
+                           if key in legacy}
+                migrate = True
+            
+            if not self._verify_password(account.get('password_hash'), password):
+                self.failed_attempts[username] = (attempts + 1, time.time())
+                return {"status": "error", "message": "Incorrect password"}
+            
+            if migrate:
+                write_json_atomic(files['account'], account, fsync=self.fsync_writes)
+            try:
+                user_data = read_json(latest_file)
+            except FileNotFoundError:
+                user_data = {"username": account['username'], "last_login": None}
+            
+            # Credentials stay in account.json; full copies per save now live
+            # in the deduplicated history store
+            for key in ('password_hash', 'created_at', 'transaction_history'):
+                user_data.pop(key, None)
+            
+            # Update user data
+            user_data['last_login'] = datetime.now().isoformat()
+            self._journal = TransactionJournal(files['journal'], fsync=self.fsync_writes)
+            snapshot = user_data.get('snapshot')
+            self.store = self._open_store(user_data, self._journal)
+            self._writer = WriteBehind(self._write_pending, self.save_delay, self.max_save_latency)
+            self.current_user = user_data
+            self.session_start = time.time()
+            
+            # Save updated data (metadata plus any IDs assigned to old records);
+            # an unchanged columnar snapshot is neither loaded nor rewritten
+            if (self.storage_backend == 'json'
+                    and snapshot == ColumnarSnapshot.available_format(self.snapshot_format)
+                    and self.store.snapshot_columns() is not None):
+                self._write_document(latest_file, dict(user_data), columns=False)
+            else:
+                self._write_document(latest_file, self._user_document())
+            if migrate:
+                # The .bak generation is the legacy document, password hash included
+                try:
+                    os.remove(f"{latest_file}.bak")
+                except FileNotFoundError:
+                    pass
+
+            return {"status": "success", "user_data": user_data}
+            
         except Exception as e:
             return {"status": "error", "message": f"Login failed: {str(e)}"}
 
-    def save_user_data(self, transactions: list = None) -> bool:
+    def save_user_data(self, transactions: list = None, user_data: dict = None) -> bool:
         """Save complete user data with session tracking"""
         if not self.current_user:
             return False
@@ -156,47 +373,173 @@ class UserManager:
             files = self._get_session_files(username)
             
             if transactions is not None:
-                # Add new transactions to history
-                formatted_transactions = [
-                    {
-                        **txn,
-                        'date': txn['date'].strftime("%Y-%m-%d") 
-                        if isinstance(txn['date'], datetime) 
-                        else txn['date']
-                    }
-                    for txn in transactions
-                ]
-                
-                self.current_user['transactions'] = formatted_transactions
-                self.current_user['transaction_history'].extend(formatted_transactions)
-            
-            # Save session snapshot (new file each time)
-            with open(files['current_json'], 'w') as f:
-                json.dump(self.current_user, f, indent=4)
-            os.chmod(files['current_json'], 0o600)
+                self.store.replace_all(username, transactions)
+                self.get_history(username).invalidate()
+            
+            if user_data is None:
+                user_data = self._user_document()
             
             # Save complete current state (overwrites latest)
-            with open(files['latest_json'], 'w') as f:
-                json.dump(self.current_user, f, indent=4)
-            os.chmod(files['latest_json'], 0o600)
+            # Transactions are serialized straight from the shared records
+            self._write_document(files['latest_json'], user_data)
             
-            # Save CSV version
-            if self.current_user.get('transactions'):
-                df = pd.DataFrame(self.current_user['transactions'])
-                df.to_csv(files['current_csv'], index=False)
-                os.chmod(files['current_csv'], 0o600)
+            # Record a deduplicated history version and evict old ones
+            if self.storage_backend == 'sqlite':
+                history = self.store.load(username)
+            else:
+                history = user_data['transactions']
+            self.get_history(username).commit(history)
+            prune_legacy_snapshots(files['data_dir'])
             
             return True
         except Exception as e:
             print(f"Error saving user data: {e}")
             return False
 
+    def record_mutation(self, op: str, **payload) -> bool:
+        """Queue a single transaction mutation (add, extend, update, delete)
+
+        The JSON store is updated in memory at once and the write is left to a
+        background writer that coalesces bursts of changes. In journal mode a
+        burst becomes one append to the user's journal, so the cost does not
+        depend on how many transactions exist; SQLite gets one transaction per
+        burst and snapshot mode one full save.
+        """
+        if not self.current_user:
+            return False
+
+        with self._lock:
+            if self.storage_backend == 'json':
+                try:
+                    self.store.apply(self.current_user['username'], op, **payload)
+                except Exception as e:
+                    print(f"Error saving transaction: {e}")
+                    return False
+            self._pending.append((op, payload))
+            if op == 'update':
+                # Changed in place, so its history chunk must be stored again
+                self.get_history().invalidate([payload['txn'].id])
+        self._writer.mark_dirty()
+        return True
+
+    def flush(self) -> bool:
+        """Write all queued changes now"""
+        return self._writer.flush() if self._writer is not None else True
+
+    def _write_pending(self) -> bool:
+        """Write queued mutations as one batch (runs on the background writer)"""
+        with self._lock:
+            if not self.current_user:
+                return True
+            mutations, self._pending = self._pending, []
+            full_save, self._full_save = self._full_save, False
+            username = self.current_user['username']
+            journaled = (self.storage_backend == 'json' and self.storage_mode == 'journal'
+                         and self._journal is not None)
+
+        try:
+            if self.storage_backend == 'sqlite':
+                self.store.apply_many(username, mutations)
+            elif journaled:
+                if mutations:
+                    seq = self._journal.append_many(mutations)
+                    with self._lock:
+                        self.current_user['journal_seq'] = seq
+            else:
+                full_save = full_save or bool(mutations)
+        except Exception as e:
+            print(f"Error saving transactions: {e}")
+            with self._lock:
+                self._pending[:0] = mutations
+                self._full_save = self._full_save or full_save
+            return False
+
+        if journaled and self._journal.pending >= self.journal_compact_threshold:
+            return self.compact_journal()
+        if full_save:
+            with self._lock:
+                snapshot = self._user_document()
+            if not self.save_user_data(user_data=snapshot):
+                with self._lock:
+                    self._full_save = True
+                return False
+        return True
+
+    def compact_journal(self) -> bool:
+        """Fold journaled mutations into latest_data.json and trim the journal"""
+        with self._lock:
+            if not self.current_user or self._journal is None:
+                return False
+            snapshot = self._user_document()
+            journal = self._journal
+        # Serialize outside the lock so new mutations keep queueing meanwhile.
+        # Records are shared, so a later change may already show in the
+        # snapshot; replaying its journal record on load is idempotent.
+        saved = self.save_user_data(user_data=snapshot)
+        if saved:
+            journal.discard_through(snapshot['journal_seq'])
+        return saved
+
+    def snapshot_columns(self):
+        """Column arrays of the current user's transactions, if the snapshot is up to date
+
+        With the 'npy' format these are read-only memory maps, so analytics
+        over them read the files lazily and copy nothing.
+        """
+        if not self.current_user or self.storage_backend != 'json':
+            return None
+        return self.store.snapshot_columns()
+
+    def snapshot_transactions(self, rows) -> list:
+        """Records at row positions of snapshot_columns(), loading only their pages"""
+        return self.store.transactions_at(rows)
+
+    def load_transactions(self) -> list:
+        """All transactions of the current user in insertion order"""
+        if not self.current_user:
+            return []
+        return self.store.load(self.current_user['username'])
+
     def logout(self):
         """Clean up session data"""
         if self.current_user:
+            self._close_writer()
+            self._finish_session()
+
+    def logout_async(self) -> Future:
+        """logout() that only writes out queued changes on the calling thread
+
+        Journal compaction, the history commit and the columnar snapshot run
+        on the worker pool; the session stays open until the returned future
+        is done, so no further changes may be made meanwhile.
+        """
+        if not self.current_user:
+            done = Future()
+            done.set_result(None)
+            return done
+        self._close_writer()
+        return self._executor().submit(self._finish_session)
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()  # write out everything still queued
+            self._writer = None
+
+    def _finish_session(self):
+        """Fold the session into latest_data.json and history, then close it"""
+        if (self.storage_backend == 'json' and self.storage_mode == 'journal'
+                and self._journal is not None):
+            self.compact_journal()
+        else:
             self.save_user_data()
-            self.current_user = None
-            self.session_start = None
+            if self._journal is not None:
+                self._journal.discard_through(self._journal.last_seq)
+        self.store.close()
+        self.current_user = None
+        self.session_start = None
+        self._journal = None
+        self._history = None
+        self.store = None
 
     def check_session(self) -> bool:
         """Validate active session"""